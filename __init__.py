@@ -40,13 +40,19 @@ from . import (
     character_count,
     code_map,
     drag_and_drop,
+    editor_draw,
     jump_to_line,
     find_replace,
     trim_whitespace,
     open_recent,
+    search_index,
+    symbol_index,
 )
 
 def reload_modules():
+    importlib.reload(search_index)
+    importlib.reload(symbol_index)
+    importlib.reload(editor_draw)
     importlib.reload(addon_updater_ops)
     importlib.reload(character_count)
     importlib.reload(code_map)
@@ -74,10 +80,16 @@ class BACKUP_OT_backup_preferences(Operator):
             "enable_code_map": prefs.enable_code_map,
             "enable_trim_whitespace": prefs.enable_trim_whitespace,
             "code_map_category": prefs.code_map_category,
+            "display_breadcrumb": prefs.display_breadcrumb,
+            "code_map_page_size": prefs.code_map_page_size,
+            "code_map_cache_entries": prefs.code_map_cache_entries,
+            "code_map_cache_size": prefs.code_map_cache_size,
+            "code_map_disk_cache_size": prefs.code_map_disk_cache_size,
             "open_recent_category": prefs.open_recent_category,
             "display_text_editor_options": prefs.display_text_editor_options,
             "enable_open_recent_panel": prefs.enable_open_recent_panel,
             "display_count_label": prefs.display_count_label,
+            "find_ignore_patterns": prefs.find_ignore_patterns,
             "enable_replace_set_selected": prefs.enable_replace_set_selected,
             "enable_find_set_selected": prefs.enable_find_set_selected,
             "auto_check_update": prefs.auto_check_update,
@@ -119,10 +131,16 @@ class RESTORE_OT_restore_preferences(Operator):
             prefs.enable_code_map = data.get("enable_code_map", True)
             prefs.enable_trim_whitespace = data.get("enable_trim_whitespace", True)
             prefs.code_map_category = data.get("code_map_category", "Code Map")
+            prefs.display_breadcrumb = data.get("display_breadcrumb", True)
+            prefs.code_map_page_size = data.get("code_map_page_size", 200)
+            prefs.code_map_cache_entries = data.get("code_map_cache_entries", 16)
+            prefs.code_map_cache_size = data.get("code_map_cache_size", 64)
+            prefs.code_map_disk_cache_size = data.get("code_map_disk_cache_size", 32)
             prefs.open_recent_category = data.get("open_recent_category", "Text")
             prefs.display_text_editor_options = data.get("display_text_editor_options", True)
             prefs.enable_open_recent_panel = data.get("enable_open_recent_panel", True)
             prefs.display_count_label = data.get("display_count_label", True)
+            prefs.find_ignore_patterns = data.get("find_ignore_patterns", search_index.DEFAULT_IGNORE_PATTERNS)
             prefs.enable_replace_set_selected = data.get("enable_replace_set_selected", True)
             prefs.enable_find_set_selected = data.get("enable_find_set_selected", True)
             prefs.auto_check_update = data.get("auto_check_update", True)
@@ -248,6 +266,47 @@ class Textify_Preferences(AddonPreferences):
         default="ALL",
     )
 
+    display_breadcrumb: BoolProperty(
+        name="Display Breadcrumb in Footer",
+        description="Show the class and function the cursor is in, like \"Class > method\", in the text editor footer",
+        default=True,
+    )
+
+    code_map_page_size: IntProperty(
+        name="Items per Page",
+        description="Maximum number of items the Code Map lays out at once, the rest is reached by paging",
+        default=200,
+        min=20,
+        max=5000,
+    )
+
+    code_map_cache_entries: IntProperty(
+        name="Parsed Scripts Cache",
+        description="Maximum number of parsed scripts kept in memory by the Code Map",
+        default=16,
+        min=1,
+        max=256,
+        update=code_map.update_ast_cache,
+    )
+
+    code_map_cache_size: IntProperty(
+        name="Cache Memory Limit (MB)",
+        description="Approximate memory the Code Map may use for parsed scripts",
+        default=64,
+        min=1,
+        max=4096,
+        update=code_map.update_ast_cache,
+    )
+
+    code_map_disk_cache_size: IntProperty(
+        name="Disk Cache Limit (MB)",
+        description="Disk space used to keep the Code Map of recently opened files between sessions",
+        default=32,
+        min=1,
+        max=1024,
+        update=code_map.update_disk_cache,
+    )
+
     # Find & replace preferences
     enable_find_set_selected: bpy.props.BoolProperty(
         name="Text Selection for Finding",
@@ -267,6 +326,12 @@ class Textify_Preferences(AddonPreferences):
         default=True
     )
 
+    find_ignore_patterns: bpy.props.StringProperty(
+        name="Ignore Patterns",
+        description="Comma separated file and folder names skipped by Find in Folder, '*' and '?' match any characters",
+        default=search_index.DEFAULT_IGNORE_PATTERNS
+    )
+
     # Open recent preferences
     enable_open_recent_panel = BoolProperty(
         name="Enable Open Recent Panel",
@@ -383,6 +448,18 @@ class Textify_Preferences(AddonPreferences):
         box.prop(self, "show_code_filters")
         box.prop(self, "show_class_type")
         box.prop(self, "code_map_category")
+        box.prop(self, "display_breadcrumb")
+        box.prop(self, "code_map_page_size")
+        box.prop(self, "code_map_cache_entries")
+        box.prop(self, "code_map_cache_size")
+
+        cache = symbol_index.ast_cache
+        row = box.row()
+        row.alignment = 'RIGHT'
+        row.label(text=f"{len(cache.entries)} cached, {cache.size / (1024 * 1024):.1f} MB, "
+                       f"{cache.hits} hits, {cache.misses} misses")
+
+        box.prop(self, "code_map_disk_cache_size")
 
     def draw_settings_find_replace(self, layout):
         box = layout.box()
@@ -392,6 +469,7 @@ class Textify_Preferences(AddonPreferences):
         box.prop(self, "enable_find_set_selected")
         box.prop(self, "enable_replace_set_selected")
         box.prop(self, "display_count_label")
+        box.prop(self, "find_ignore_patterns")
 
     def draw_settings_open_recent(self, layout):
         box = layout.box()
@@ -426,6 +504,8 @@ def register():
     prefs = context.preferences.addons[__package__].preferences
 
     open_recent.update_ui(prefs, context)
+    code_map.update_ast_cache(prefs, context)
+    code_map.disk_cache.max_bytes = prefs.code_map_disk_cache_size * 1024 * 1024
     Textify_Preferences.update_cm_category(prefs, context)
     Textify_Preferences.update_op_category(prefs, context)
 
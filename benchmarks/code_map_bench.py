@@ -0,0 +1,375 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+
+"""Headless benchmark of the Code Map outline.
+
+Runs ``DrawHelper.draw`` outside of Blender against generated scripts of
+growing size and prints, per size, the time of a full parse, of an
+incremental re-parse after a one line edit, of one panel draw (collapsed
+and fully expanded), the number of widgets a draw creates and the peak
+memory of parsing and drawing.
+
+bpy, gpu and gpu_extras are replaced by small stand-ins that only record
+what the panel asks for, so the numbers cover the addon's own Python work,
+not Blender's layout engine.
+
+    python benchmarks/code_map_bench.py
+    python benchmarks/code_map_bench.py --sizes 1000 20000 --repeat 20
+"""
+
+import argparse
+import importlib
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+import types
+
+
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = "textify_bench"
+
+DEFAULT_SIZES = (100, 1000, 5000, 10000, 50000)
+
+
+# -------------------------------------------------------------
+#                        bpy Stand-ins
+# -------------------------------------------------------------
+
+
+class Namespace:
+    def __init__(self, **attributes):
+        self.__dict__.update(attributes)
+
+
+class Layout:
+    """Records the widgets created on it and on every sub-layout."""
+
+    def __init__(self, counter=None):
+        self.counter = counter if counter is not None else {"widgets": 0, "layouts": 0}
+
+    def _layout(self, *args, **kwargs):
+        self.counter["layouts"] += 1
+        return Layout(self.counter)
+
+    row = column = box = split = _layout
+
+    def _widget(self, *args, **kwargs):
+        self.counter["widgets"] += 1
+        return Namespace()
+
+    label = prop = operator = _widget
+
+    def separator(self, *args, **kwargs):
+        pass
+
+    separator_spacer = separator
+
+
+class TextLine:
+    __slots__ = ("body",)
+
+    def __init__(self, body):
+        self.body = body
+
+
+class Text:
+    def __init__(self, name, source):
+        self.name = name
+        self.filepath = ""
+        self.source = source
+        self.lines = [TextLine(line) for line in source.split("\n")]
+        self.current_line_index = len(self.lines) // 2
+        self.select_end_line_index = self.current_line_index
+
+    def as_string(self):
+        return self.source
+
+
+class Previews(dict):
+    def load(self, name, path, path_type):
+        self[name] = Namespace(icon_id=len(self))
+
+
+class Collection(list):
+    def add(self):
+        item = Namespace(name="", value="")
+        self.append(item)
+        return item
+
+
+class Texts(dict):
+    """Text blocks by name, iterating over the texts like bpy.data.texts."""
+
+    def __iter__(self):
+        return iter(self.values())
+
+
+class Addons(dict):
+    def __missing__(self, key):
+        return self["default"]
+
+
+def install_stand_ins():
+    """Register fake bpy, gpu and gpu_extras modules and return the context."""
+    bpy = types.ModuleType("bpy")
+
+    class Base:
+        def __init_subclass__(cls, **kwargs):
+            pass
+
+    class Header:
+        @classmethod
+        def append(cls, function):
+            pass
+
+        remove = append
+
+    bpy.types = Namespace(
+        Operator=Base, Panel=Base, PropertyGroup=Base, UIList=Base, Menu=Base,
+        AddonPreferences=Base, WindowManager=Namespace(), TEXT_HT_footer=Header,
+        SpaceTextEditor=Namespace(draw_handler_add=lambda *args: None, draw_handler_remove=lambda *args: None),
+    )
+    bpy.props = types.ModuleType("bpy.props")
+    for name in ("CollectionProperty", "StringProperty", "IntProperty", "BoolProperty",
+                 "EnumProperty", "PointerProperty", "FloatProperty"):
+        setattr(bpy.props, name, lambda *args, **kwargs: None)
+    bpy.utils = types.ModuleType("bpy.utils")
+    bpy.utils.previews = Namespace(new=Previews, remove=lambda previews: None)
+    bpy.app = Namespace(
+        version=(4, 1, 0),
+        timers=Namespace(register=lambda *args, **kwargs: None, is_registered=lambda function: False,
+                         unregister=lambda function: None),
+    )
+    bpy.path = Namespace(abspath=lambda path: path)
+    bpy.data = Namespace(texts=Texts())
+
+    prefs = Namespace(
+        enable_code_map=True, auto_activate_search=False, display_code_filters=True,
+        display_class_type=True, code_filter_type="ALL", code_map_page_size=200,
+        display_function_indicator=True, display_class_indicator=True, display_breadcrumb=True,
+    )
+    properties = Namespace(
+        display_classes=True, display_variables=True, display_functions=True,
+        display_class_functions=True, display_properties=True, page=0, display_minimap=False,
+    )
+    context = Namespace(
+        preferences=Namespace(addons=Addons(default=Namespace(preferences=prefs)),
+                              system=Namespace(ui_scale=1.0)),
+        window_manager=Namespace(search="", code_map_properties=properties, display_def_lines=Collection(),
+                                 windows=[]),
+        space_data=Namespace(text=None),
+    )
+    bpy.context = context
+
+    gpu = types.ModuleType("gpu")
+    gpu_extras = types.ModuleType("gpu_extras")
+    gpu_extras.batch = types.ModuleType("gpu_extras.batch")
+    gpu_extras.batch.batch_for_shader = lambda *args, **kwargs: None
+
+    sys.modules.update({
+        "bpy": bpy, "bpy.types": bpy.types, "bpy.props": bpy.props, "bpy.utils": bpy.utils,
+        "gpu": gpu, "gpu_extras": gpu_extras, "gpu_extras.batch": gpu_extras.batch,
+    })
+    return context
+
+
+def import_code_map():
+    # A package pointing at the addon folder, so the relative imports of
+    # code_map work without running the addon's __init__
+    package = types.ModuleType(PACKAGE)
+    package.__path__ = [ADDON_DIR]
+    sys.modules[PACKAGE] = package
+    return importlib.import_module(PACKAGE + ".code_map")
+
+
+# -------------------------------------------------------------
+#                       Script Generator
+# -------------------------------------------------------------
+
+
+CLASS_TEMPLATE = '''class ITEM_OT_operator_{n}(bpy.types.Operator):
+    bl_idname = "item.operator_{n}"
+    bl_label = "Operator {n}"
+
+    amount: FloatProperty(default=1.0)
+    count: IntProperty(default={n})
+
+    class Settings:
+        enabled = True
+
+        def reset(self):
+            self.enabled = False
+
+    def execute(self, context):
+        def helper(value):
+            return value * self.amount
+
+        for i in range(self.count):
+            helper(i)
+        return {{'FINISHED'}}
+
+    async def refresh(self):
+        pass
+
+'''
+
+FUNCTION_TEMPLATE = '''def compute_{n}(values, factor={n}):
+    """Scale the values."""
+    total = 0
+    for value in values:
+        if value > factor:
+            total += value * factor
+        else:
+            total -= value
+    return total
+
+'''
+
+VARIABLE_TEMPLATE = '''SETTING_{n} = {{"name": "setting_{n}", "value": {n}}}
+
+'''
+
+
+def generate_script(line_count):
+    """A script of about ``line_count`` lines mixing classes, functions and variables."""
+    parts = ["import bpy\n", "from bpy.props import FloatProperty, IntProperty\n\n\n"]
+    lines = 3
+    n = 0
+
+    while lines < line_count:
+        for template in (CLASS_TEMPLATE, FUNCTION_TEMPLATE, VARIABLE_TEMPLATE):
+            part = template.format(n=n)
+            parts.append(part)
+            lines += part.count("\n")
+        n += 1
+
+    return "".join(parts)
+
+
+# -------------------------------------------------------------
+#                           Benchmark
+# -------------------------------------------------------------
+
+
+def timed(function, repeat):
+    """Median seconds of ``repeat`` calls and the result of the last one."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+
+def bench_size(code_map, context, line_count, repeat):
+    symbol_index = code_map.symbol_index
+    source = generate_script(line_count)
+    text = Text("bench_{}.py".format(line_count), source)
+    context.space_data.text = text
+    code_map.bpy.data.texts.clear()
+    code_map.bpy.data.texts[text.name] = text
+    wm = context.window_manager
+
+    def parse():
+        symbol_index.ast_cache.clear()
+        return symbol_index.build_index(source, text.name)
+
+    parse_time, index = timed(parse, max(1, repeat // 4))
+
+    # A one line edit in the middle of the script
+    lines = source.split("\n")
+    lines[len(lines) // 2] += "  # edited"
+    edited = "\n".join(lines)
+    update_time, _ = timed(lambda: symbol_index.update_index(index, edited, text.name), repeat)
+
+    code_map.symbol_indexes.clear()
+    code_map.symbol_indexes[text.name] = index
+    helper = code_map.DrawHelper()
+
+    def draw():
+        layout = Layout()
+        helper.draw(layout, context, text, wm)
+        return layout.counter
+
+    wm.display_def_lines.clear()
+    code_map.expanded_paths["count"] = -1
+    collapsed_time, collapsed = timed(draw, repeat)
+
+    for symbol in index.symbols:
+        if symbol.has_children:
+            wm.display_def_lines.add().value = code_map.expand_key(text, symbol)
+    code_map.expanded_paths["count"] = -1
+    expanded_time, expanded = timed(draw, repeat)
+
+    wm.search = "comp"
+    search_time, _ = timed(draw, repeat)
+    wm.search = ""
+
+    code_map.symbol_indexes.clear()
+    symbol_index.ast_cache.clear()
+    tracemalloc.start()
+    index = symbol_index.build_index(source, text.name)
+    code_map.symbol_indexes[text.name] = index
+    draw()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "lines": len(lines),
+        "symbols": len(index.symbols),
+        "parse": parse_time,
+        "update": update_time,
+        "draw": collapsed_time,
+        "draw_expanded": expanded_time,
+        "draw_search": search_time,
+        "widgets": collapsed["widgets"],
+        "widgets_expanded": expanded["widgets"],
+        "peak": peak,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="Line counts of the generated scripts")
+    parser.add_argument("--repeat", type=int, default=10, help="Runs per measurement, the median is shown")
+    args = parser.parse_args(argv)
+
+    context = install_stand_ins()
+    code_map = import_code_map()
+
+    header = "{:>7} {:>8} {:>10} {:>10} {:>10} {:>10} {:>10} {:>9} {:>9} {:>10}".format(
+        "lines", "symbols", "parse ms", "update ms", "draw ms", "expand ms", "search ms",
+        "widgets", "expanded", "peak MB")
+    print(header)
+    print("-" * len(header))
+
+    for size in args.sizes:
+        result = bench_size(code_map, context, size, args.repeat)
+        print("{lines:>7} {symbols:>8} {parse:>10.2f} {update:>10.2f} {draw:>10.3f} {draw_expanded:>10.3f} "
+              "{draw_search:>10.3f} {widgets:>9} {widgets_expanded:>9} {peak:>10.1f}".format(
+                  **dict(result, parse=result["parse"] * 1000, update=result["update"] * 1000,
+                         draw=result["draw"] * 1000, draw_expanded=result["draw_expanded"] * 1000,
+                         draw_search=result["draw_search"] * 1000, peak=result["peak"] / (1024 * 1024))))
+
+
+if __name__ == "__main__":
+    main()
@@ -18,13 +18,22 @@
 
 
 import bpy
+import gpu
+import heapq
+import multiprocessing
 import os
-import ast
+import sys
+import traceback
+
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor
 
 from bpy.utils import previews
 from bpy.types import Operator, Panel, PropertyGroup, WindowManager
 from bpy.props import CollectionProperty, StringProperty, IntProperty, BoolProperty, EnumProperty, PointerProperty
 
+from . import symbol_index
+from .editor_draw import add_rect, free_shaders, get_shader, prune_removed_texts, redraw_text_editors, tris_batch
+
 
 # -------------------------------------------------------------
 #                            Icon
@@ -61,6 +70,16 @@ def unload_icons():
         custom_icons = None
 
 
+# Icon drawn for each kind of symbol
+SYMBOL_ICONS = {
+    symbol_index.CLASS: "class",
+    symbol_index.METHOD: "method",
+    symbol_index.PROPERTY: "property",
+    symbol_index.FUNCTION: "function",
+    symbol_index.VARIABLE: "variable",
+}
+
+
 # -------------------------------------------------------------
 #                          Operators
 # -------------------------------------------------------------
@@ -71,16 +90,39 @@ class CODE_MAP_OT_jump(Operator):
     bl_label = "Jump to Line"
 
     line_number: IntProperty()
+    text_name: StringProperty(description="Text block to switch to first, the active one if empty")
 
     @classmethod
     def description(cls, context, properties):
+        if properties.text_name:
+            return "Jump to line {} of {}".format(properties.line_number, properties.text_name)
         return "Jump to line {}".format(properties.line_number)
 
     def execute(self, context):
+        if self.text_name:
+            text = bpy.data.texts.get(self.text_name)
+            if text is None:
+                self.report({'WARNING'}, f"Text not found: {self.text_name}")
+                return {'CANCELLED'}
+            context.space_data.text = text
+
         bpy.ops.text.jump(line=self.line_number)
         return {'FINISHED'}
 
 
+class CODE_MAP_OT_page(Operator):
+    bl_idname = "code_map.page"
+    bl_label = "Change Page"
+    bl_description = "Show another page of the Code Map"
+    bl_options = {'INTERNAL'}
+
+    page: IntProperty()
+
+    def execute(self, context):
+        context.window_manager.code_map_properties.page = max(0, self.page)
+        return {'FINISHED'}
+
+
 class CODE_MAP_OT_dynamic_toggle(Operator):
     bl_idname = "code_map.toggle_string"
     bl_label = "Show functions and properties"
@@ -98,14 +140,16 @@ class CODE_MAP_OT_dynamic_toggle(Operator):
             data = getattr(data, path)
         prop_collection = getattr(data, attr)
 
-        for index, item in enumerate(prop_collection):
-            if item.value == self.value:
-                prop_collection.remove(index)
-                break
+        # Items are named after their value, so the lookup happens on the C side
+        index = prop_collection.find(self.value)
+        if index >= 0:
+            prop_collection.remove(index)
         else:
             new_item = prop_collection.add()
+            new_item.name = self.value
             new_item.value = self.value
 
+        expanded_paths["count"] = -1
         return {'FINISHED'}
 
 
@@ -123,6 +167,385 @@ class CODE_MAP_PG_properties(PropertyGroup):
     display_class_functions: BoolProperty(default=True, description="Show Class Functions")
     display_properties: BoolProperty(default=True, description="Show Properties")
 
+    page: IntProperty(min=0, description="Page of the Code Map shown in the panel")
+
+    display_minimap: BoolProperty(default=False, description="Show a minimap of the text in the editor",
+                                  update=lambda self, context: redraw_text_editors())
+
+
+# -------------------------------------------------------------
+#                         Symbol Index
+# -------------------------------------------------------------
+
+
+# Last built index of every text block, keyed by the text name
+symbol_indexes = {}
+
+# Texts with fewer lines are parsed right away in the draw callback, bigger
+# ones are handed to a worker thread while the last index keeps being drawn.
+BACKGROUND_PARSE_LINES = 2000
+
+# Seconds between checks for finished background parses
+PARSE_POLL_INTERVAL = 0.05
+
+parse_executor = None
+parse_process = None  # forked process the parse thread hands sources to, False where there is none
+pending_parses = {}  # text name -> future
+
+# Indexes of files opened through Open Recent, kept across sessions
+disk_cache = symbol_index.DiskCache(os.path.join(os.path.expanduser("~/Documents/Open Recent"), "code_map_cache"))
+files_to_cache = {}  # text name -> (filepath, stat) of opened files with no valid cache entry
+
+
+def get_symbol_index(text):
+    """Return the index of ``text``, or None until its first parse finished."""
+    forget_removed_texts()
+
+    source = text.as_string()
+    index = symbol_indexes.get(text.name)
+
+    # Only update when the text changed since the last draw
+    if index is not None and index.source == source:
+        return index
+
+    if len(text.lines) < BACKGROUND_PARSE_LINES:
+        index = symbol_index.update_index(index, source, text.name)
+        store_index(text.name, index)
+        return index
+
+    # One parse per text at a time, newer edits are picked up once it is done
+    if text.name not in pending_parses:
+        submit_parse(text.name, index, source)
+
+    return index
+
+
+def forget_removed_texts():
+    """Drop the indexes of texts that were removed or renamed."""
+    if len(symbol_indexes) <= len(bpy.data.texts):
+        return
+
+    names = set(bpy.data.texts.keys())
+    for name in list(symbol_indexes):
+        if name not in names and name not in pending_parses:
+            del symbol_indexes[name]
+            symbol_index.ast_cache.discard(name)
+
+
+def submit_parse(name, index, source):
+    global parse_executor
+    if parse_executor is None:
+        parse_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="code_map")
+
+    future = parse_executor.submit(parse_in_background, index, source, name)
+    pending_parses[name] = future
+
+    if not bpy.app.timers.is_registered(apply_parsed_indexes):
+        bpy.app.timers.register(apply_parsed_indexes, first_interval=PARSE_POLL_INTERVAL)
+
+
+def create_parse_process():
+    """A single forked process to parse in, None where processes cannot be forked.
+
+    As for Find in Folder, spawned processes would start another Blender.
+    """
+    if sys.platform.startswith("linux") and "fork" in multiprocessing.get_all_start_methods():
+        try:
+            return ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("fork"))
+        except (OSError, ValueError):
+            pass
+    return None
+
+
+def parse_in_background(index, source, name):
+    """Return the updated index of a big text, runs on the parse thread.
+
+    ast.parse holds the GIL, and Blender's garbage collector would walk the
+    trees while holding it too, so the parse runs in a forked process and
+    this thread only rebuilds the index from its data. Without one the
+    source is parsed here in short runs (see ``symbol_index.parse_runs``).
+    """
+    global parse_process
+    if parse_process is None:
+        parse_process = create_parse_process() or False
+
+    if parse_process:
+        try:
+            data = parse_process.submit(symbol_index.update_index_data, name, source).result()
+        except BrokenExecutor:
+            # The process died, parse on this thread from now on
+            parse_process.shutdown(wait=False)
+            parse_process = False
+        else:
+            return symbol_index.index_from_data(source, data)
+
+    return symbol_index.update_index(index, source, name)
+
+
+def store_index(name, index):
+    symbol_indexes[name] = index
+
+    # The first index of a freshly opened file is written to the disk cache
+    file = files_to_cache.pop(name, None)
+    if file is not None:
+        disk_cache.save(file[0], index, file[1])
+
+
+def load_cached_index(text):
+    """Use the disk cache for a text just opened from a file.
+
+    On a hit the outline is there without parsing, otherwise the file is
+    remembered so its first index gets stored.
+    """
+    filepath = bpy.path.abspath(text.filepath)
+    try:
+        stat = os.stat(filepath)
+    except OSError:
+        return
+
+    index = disk_cache.load(filepath, text.as_string(), stat)
+    if index is not None:
+        symbol_indexes[text.name] = index
+    else:
+        files_to_cache[text.name] = (filepath, stat)
+
+
+def apply_parsed_indexes():
+    """Timer moving finished background parses into the index on the main thread."""
+    updated = False
+
+    for name, future in list(pending_parses.items()):
+        if not future.done():
+            continue
+
+        del pending_parses[name]
+        try:
+            store_index(name, future.result())
+            updated = True
+        except Exception:
+            traceback.print_exc()
+
+    if updated:
+        redraw_text_editors()
+
+    return PARSE_POLL_INTERVAL if pending_parses else None
+
+
+# Last workspace search, reused until the query or one of the indexes changes
+workspace_search = {"query": None, "indexes": [], "results": []}
+
+
+def search_workspace(query):
+    """Fuzzy match ``query`` against the symbols of every text block.
+
+    Each text keeps its own incrementally updated index, so only texts that
+    changed since the last search are re-indexed. Returns (text name, symbol)
+    pairs, best match first.
+    """
+    indexes = []
+    for text in bpy.data.texts:
+        index = get_symbol_index(text)
+        if index is not None:
+            indexes.append((text.name, index))
+
+    # The indexes themselves are kept and compared by identity, the id of a
+    # freed index can come back for a new one
+    cached = workspace_search["indexes"]
+    unchanged = (workspace_search["query"] == query.lower() and len(cached) == len(indexes)
+                 and all(name == cached_name and index is cached_index
+                         for (name, index), (cached_name, cached_index) in zip(indexes, cached)))
+    if not unchanged:
+        ranked = heapq.merge(*[
+            [(score, name, lineno, symbol) for score, lineno, symbol in index.scored_search(query)]
+            for name, index in indexes
+        ], key=lambda item: item[:3])
+        workspace_search["results"] = [(name, symbol) for _, name, _, symbol in ranked]
+        workspace_search["query"] = query.lower()
+        workspace_search["indexes"] = indexes
+
+    return workspace_search["results"]
+
+
+# Expanded classes and functions as "text:Outer.Inner" paths, mirrored from
+# WindowManager.display_def_lines and only rebuilt after it changed
+expanded_paths = {"count": -1, "paths": set()}
+
+
+def expand_key(text, symbol):
+    return "{}:{}".format(text.name, symbol.qualname)
+
+
+def get_expanded_paths(wm):
+    items = wm.display_def_lines
+    if expanded_paths["count"] != len(items):
+        expanded_paths["paths"] = {item.value for item in items}
+        expanded_paths["count"] = len(items)
+    return expanded_paths["paths"]
+
+
+def reset_page(self, context):
+    context.window_manager.code_map_properties.page = 0
+
+
+def update_ast_cache(self, context):
+    symbol_index.ast_cache.configure(self.code_map_cache_entries, self.code_map_cache_size * 1024 * 1024)
+
+
+def update_disk_cache(self, context):
+    disk_cache.max_bytes = self.code_map_disk_cache_size * 1024 * 1024
+    disk_cache.prune()
+
+
+# -------------------------------------------------------------
+#                          Breadcrumb
+# -------------------------------------------------------------
+
+
+def breadcrumb(self, context):
+    """Footer label with the classes and functions around the cursor."""
+    prefs = context.preferences.addons[__package__].preferences
+    text = context.space_data.text
+    if not (prefs.enable_code_map and prefs.display_breadcrumb and text):
+        return
+
+    index = get_symbol_index(text)
+    if index is None:
+        return
+
+    # Same line as the character count, the end of the selection
+    scopes = index.scopes.scopes_at(text.select_end_line_index + 1)
+    if not scopes:
+        return
+
+    load_icons()
+
+    layout = self.layout
+    layout.separator()
+    layout.label(text=" > ".join(scope.name for scope in scopes),
+                 icon_value=custom_icons[SYMBOL_ICONS[scopes[-1].kind]].icon_id)
+
+
+# -------------------------------------------------------------
+#                           Minimap
+# -------------------------------------------------------------
+
+
+# Columns covered by the minimap, longer lines are cut off
+MINIMAP_COLUMNS = 100
+MINIMAP_WIDTH = 100  # Pixels, before the interface scale
+MINIMAP_MAX_LINE_HEIGHT = 3.0  # Pixels per line on short texts
+
+MINIMAP_LINE_COLOR = (0.8, 0.8, 0.8, 0.35)
+MINIMAP_VIEW_COLOR = (1.0, 1.0, 1.0, 0.08)
+
+# Band drawn behind the lines of every symbol, by kind
+MINIMAP_COLORS = {
+    symbol_index.CLASS: (0.95, 0.55, 0.2, 0.18),
+    symbol_index.METHOD: (0.3, 0.65, 1.0, 0.14),
+    symbol_index.FUNCTION: (0.35, 0.85, 0.45, 0.14),
+    symbol_index.PROPERTY: (0.85, 0.45, 0.9, 0.5),
+    symbol_index.VARIABLE: (0.9, 0.85, 0.3, 0.5),
+}
+
+minimap_handler = None
+minimap_batches = {}  # text name -> (index, batch, line count)
+minimap_view = {"batch": None}  # Unit square marking the lines in view
+
+
+def build_minimap_batch(index):
+    """One batch with a band per symbol and a bar per line of text.
+
+    Vertices are in text space (one unit per column and line, line 0 at
+    y = 0 going down), the draw callback maps them onto the region with the
+    matrix stack, so the batch only changes with the text.
+    """
+    positions = []
+    colors = []
+    lines = index.source.split("\n")
+
+    for symbol in index.symbols:
+        color = MINIMAP_COLORS[symbol.kind]
+        if symbol.kind in symbol_index.SCOPE_KINDS:
+            body = symbol.body.expandtabs(4)
+            indent = len(body) - len(body.lstrip())
+            add_rect(positions, colors, min(indent, MINIMAP_COLUMNS), -(symbol.lineno - 1),
+                     MINIMAP_COLUMNS, -symbol.end_lineno, color)
+        else:
+            # Short marker in front of variables and properties
+            add_rect(positions, colors, 0, -(symbol.lineno - 1), 2, -symbol.lineno, color)
+
+    # Tabs are 4 columns wide for both the bands and the bars
+    for i, line in enumerate(lines):
+        line = line.expandtabs(4)
+        stripped = line.strip()
+        if not stripped:
+            continue
+        indent = len(line) - len(line.lstrip())
+        if indent >= MINIMAP_COLUMNS:
+            continue
+        end = min(indent + len(stripped), MINIMAP_COLUMNS)
+        add_rect(positions, colors, indent, -i, end, -i - 0.7, MINIMAP_LINE_COLOR)
+
+    return tris_batch("FLAT_COLOR", positions, colors), len(lines)
+
+
+def draw_minimap():
+    context = bpy.context
+    st = context.space_data
+    text = st.text
+    if text is None or not context.window_manager.code_map_properties.display_minimap:
+        return
+
+    prefs = context.preferences.addons[__package__].preferences
+    if not prefs.enable_code_map:
+        return
+
+    index = get_symbol_index(text)
+    if index is None:
+        return
+
+    cached = minimap_batches.get(text.name)
+    if cached is None or cached[0] is not index:
+        cached = minimap_batches[text.name] = (index,) + build_minimap_batch(index)
+    _, batch, line_count = cached
+
+    region = context.region
+    ui_scale = context.preferences.system.ui_scale
+    width = MINIMAP_WIDTH * ui_scale
+    left = region.width - width - 20 * ui_scale  # Clear of the scrollbar
+    top = region.height
+    line_height = min(MINIMAP_MAX_LINE_HEIGHT * ui_scale, region.height / max(line_count, 1))
+
+    if hasattr(gpu, "state"):
+        gpu.state.blend_set('ALPHA')
+
+    with gpu.matrix.push_pop():
+        gpu.matrix.translate((left, top))
+        gpu.matrix.scale((width / MINIMAP_COLUMNS, line_height))
+
+        shader = get_shader("FLAT_COLOR")
+        shader.bind()
+        batch.draw(shader)
+
+        # Lines currently shown in the editor
+        if minimap_view["batch"] is None:
+            positions = []
+            add_rect(positions, None, 0, 0, 1, -1)
+            minimap_view["batch"] = tris_batch("UNIFORM_COLOR", positions)
+
+        gpu.matrix.translate((0, -st.top))
+        gpu.matrix.scale((MINIMAP_COLUMNS, st.visible_lines))
+
+        shader = get_shader("UNIFORM_COLOR")
+        shader.bind()
+        shader.uniform_float("color", MINIMAP_VIEW_COLOR)
+        minimap_view["batch"].draw(shader)
+
+    if hasattr(gpu, "state"):
+        gpu.state.blend_set('NONE')
+
+    prune_removed_texts(minimap_batches)
+
 
 # -------------------------------------------------------------
 #                          Draw Helper
@@ -140,6 +563,8 @@ class DrawHelper:
         if prefs.auto_activate_search:
             row.activate_init = True
         row.prop(wm, "search", text="", icon="VIEWZOOM")
+        row.operator("code_map.workspace_symbols", text="", icon="DOCUMENTS")
+        row.prop(props, "display_minimap", text="", icon="ALIGN_JUSTIFY")
 
         # Check if the toggle is enabled in the addon preferences
         if prefs.display_code_filters:
@@ -159,251 +584,214 @@ class DrawHelper:
         if props.display_classes and prefs.display_class_type:
             layout.prop(prefs, "code_filter_type", text="")
 
-        if text is not None:
-            class_name = None
-            is_class_name = False
-
-            # Check if there is a class in the current text block
-            has_class = any(line.body.startswith("class ") for line in text.lines)
-
-            for i, line in enumerate(text.lines):
-                # Check if the search term is in the line
-                search_in_line = wm.search.lower() in line.body.lower()
-
-                # Check for class and function lines
-                if line.body.startswith("class "):
-                    class_name, base_class = self.parse_class_line(line.body)
-                    has_methods = self.has_methods(text.lines[i + 1:], class_name)
-                    is_class_name = any(item.value == class_name for item in wm.display_def_lines)
-
-                    if self.is_match(wm.search, class_name, line, has_methods) and props.display_classes:
-                        self.draw_class_row(layout, context, text, class_name, base_class,
-                                            has_methods, is_class_name, i, wm)
+        index = get_symbol_index(text) if text is not None else None
 
-                # Check for constants
-                elif " = " in line.body and not line.body.startswith(" ") and not line.body.startswith("#") and search_in_line and props.display_variables:
-                    self.draw_variable_row(layout, text, line.body, i, has_class, wm)
+        if index is not None:
+            # Classes and functions the cursor is currently in
+            active_scopes = index.scopes.scopes_at(text.current_line_index + 1)
 
-                # Check for functions
-                elif line.body.startswith("def ") and search_in_line and props.display_functions:
-                    self.draw_function_row(layout, context, text, line.body, i, has_class, wm)
+            # Ranked matches while searching, the outline otherwise
+            search = wm.search.strip()
+            symbols = index.search(search) if search else index.symbols
 
-                # Check for functions inside a class
-                elif line.body.startswith("    def ") and is_class_name and search_in_line and props.display_class_functions:
-                    self.draw_class_function_row(layout, text, line.body, i)
-
-                # Check for properties
-                elif ": " in line.body and is_class_name and not line.body[4].isspace() and not line.body.startswith("#") and search_in_line and props.display_class_functions:
-                    self.draw_property_row(layout, text, line.body, i)
-
-                # Check for properties and functions inside a class for wm.search
-                elif wm.search.strip():
-                    if ": " in line.body and not line.body[4].isspace() and search_in_line:
-                        self.draw_property_row(layout, text, line.body, i)
-
-                    elif line.body.startswith("    def ") and search_in_line:
-                        self.draw_class_function_row(layout, text, line.body, i)
+            self.draw_symbols(layout, context, text, index, symbols, bool(search), active_scopes, wm)
+        elif text is not None:
+            layout.label(text="Parsing...", icon="SORTTIME")
         else:
             layout.active = False
 
-    def parse_class_line(self, line):
-        class_name = line.split("(")[0].replace("class ", "").strip().replace(":", "").strip()
+    def draw_symbols(self, layout, context, text, index, symbols, searching, active_scopes, wm):
+        props = wm.code_map_properties
+        prefs = context.preferences.addons[__package__].preferences
 
-        # Check if there is a base class specified
-        if "(" in line and ")" in line:
-            base_class = line.split("(")[1].split(")")[0].replace("bpy.types.", "").strip()
+        # Classes of the filtered type, None when all of them are shown
+        if prefs.code_filter_type == "ALL":
+            shown_classes = None
         else:
-            base_class = None
+            shown_classes = index.class_types.get(prefs.code_filter_type, ())
+
+        rows = self.visible_rows(text, symbols, searching, props, shown_classes, wm)
+
+        # Top-level rows leave room for the expand arrows when there are any
+        has_toggles = index.has_class or index.has_nested
+
+        # Only lay out one page of rows, the layout cost grows with every widget
+        page_size = prefs.code_map_page_size
+        page_count = max(1, -(-len(rows) // page_size))
+        page = min(props.page, page_count - 1)
+        start = page * page_size
+        page_rows = rows[start:start + page_size]
+
+        for symbol, is_expanded in page_rows:
+            if symbol.depth:
+                self.draw_nested_row(layout, context, text, symbol, is_expanded, active_scopes, wm)
+            elif symbol.kind == symbol_index.CLASS:
+                self.draw_class_row(layout, context, text, symbol, is_expanded, active_scopes, wm)
+            elif symbol.kind == symbol_index.VARIABLE:
+                self.draw_variable_row(layout, text, symbol, has_toggles, wm)
+            else:
+                self.draw_function_row(layout, context, text, symbol, is_expanded, has_toggles,
+                                       active_scopes, wm)
+
+        if page_count > 1:
+            self.draw_pager(layout, page, page_count, start, len(page_rows), len(rows))
+
+    def visible_rows(self, text, symbols, searching, props, shown_classes, wm):
+        """(symbol, is_expanded) pairs that pass the filters, without drawing anything.
+
+        Symbols are in preorder, so a collapsed or hidden class or function
+        skips its whole subtree at once and the walk only visits the rows
+        that end up visible. Search results are listed flat.
+        """
+        rows = []
+
+        if searching:
+            for symbol in symbols:
+                if self.is_kind_shown(symbol, props, shown_classes):
+                    rows.append((symbol, False))
+            return rows
+
+        expanded = get_expanded_paths(wm)
+
+        i = 0
+        while i < len(symbols):
+            symbol = symbols[i]
+
+            if not self.is_kind_shown(symbol, props, shown_classes):
+                i += symbol.size + 1
+                continue
+
+            is_expanded = symbol.has_children and expand_key(text, symbol) in expanded
+            rows.append((symbol, is_expanded))
+            i += 1 if is_expanded else symbol.size + 1
+
+        return rows
+
+    def is_kind_shown(self, symbol, props, shown_classes):
+        kind = symbol.kind
+        if kind == symbol_index.CLASS:
+            return props.display_classes and (shown_classes is None or symbol in shown_classes)
+        if kind == symbol_index.FUNCTION:
+            return props.display_functions
+        if kind == symbol_index.METHOD:
+            return props.display_class_functions
+        if kind == symbol_index.PROPERTY:
+            return props.display_properties
+        return props.display_variables
+
+    def draw_pager(self, layout, page, page_count, start, count, total):
+        layout.separator(factor=0.5)
 
-        return class_name, base_class
+        row = layout.row(align=True)
 
-    def has_methods(self, lines, class_name):
-        for l in lines:
-            if l.body.startswith("class "):
-                break
-            if l.body.startswith("    def ") or (
-                    ": " in l.body and not l.body[4].isspace()):
-                return True
-        return False
+        sub = row.row(align=True)
+        sub.enabled = page > 0
+        sub.operator("code_map.page", text="", icon="TRIA_LEFT").page = page - 1
 
-    def is_match(self, search, class_name, line, has_methods):
-        return search.lower() in class_name.lower() or (
-            has_methods and search.lower() in line.body.lower())
+        row.label(text=f"{start + 1}-{start + count} of {total}")
+
+        sub = row.row(align=True)
+        sub.enabled = page < page_count - 1
+        sub.operator("code_map.page", text="", icon="TRIA_RIGHT").page = page + 1
 
     def truncate_text(self, text, max_length=37):
         if len(text) > max_length:
             return text[:max_length] + "..."
         return text
 
-    def get_indentation(self, version):
-        if version >= (3, 0, 0):
-            return "            "
-        else:
-            return "    "
-
-    def get_class_type(self, class_name, base_class):
-        if "Panel" in base_class:
-            return "PANEL"
-        elif "Operator" in base_class:
-            return "OPERATOR"
-        elif "PropertyGroup" in base_class:
-            return "PROPERTY_GROUP"
-        elif "UIList" in base_class:
-            return "UI_LIST"
-        elif "AddonPreferences" in base_class:
-            return "ADDON_PREFERENCES"
-        else:
-            return "UNKNOWN"
-
-    def draw_variable_row(self, layout, text, line, i, has_class, wm):
+    def draw_variable_row(self, layout, text, symbol, has_toggles, wm):
         row = layout.row(align=True)
         row.alignment = 'LEFT'
 
-        if has_class and not wm.search.strip():
+        if has_toggles and not wm.search.strip():
             row.label(text="", icon="BLANK1")
 
-        # Get the first word from the line
-        constant = line.split()[0]
-        constant = self.truncate_text(constant)
+        constant = self.truncate_text(symbol.name)
 
         row.operator("code_map.jump", text=constant, icon_value=custom_icons["variable"].icon_id,
-                     emboss=False).line_number = i + 1
+                     emboss=False).line_number = symbol.lineno
+
+    def draw_toggle(self, layout, text, symbol, is_expanded, wm):
+        # Arrow expanding a class or function with nested symbols, or a blank
+        # icon keeping the names aligned
+        if not symbol.has_children:
+            layout.label(text="", icon="BLANK1")
+            return
 
-    def draw_function_row(self, layout, context, text, line, i, has_class, wm):
+        sub = layout.row(align=True)
+        icon = 'DOWNARROW_HLT' if is_expanded else 'RIGHTARROW'
+        prop = sub.operator("code_map.toggle_string", text="", icon=icon, emboss=False)
+        prop.data_path = "window_manager.display_def_lines"
+        prop.value = expand_key(text, symbol)
+
+        if wm.search.strip():
+            sub.enabled = False
+
+    def draw_active_indicator(self, layout, context, symbol, active_scopes):
         prefs = context.preferences.addons[__package__].preferences
-        
+
+        if symbol.kind == symbol_index.CLASS:
+            shown = prefs.display_class_indicator
+        else:
+            shown = prefs.display_function_indicator
+
+        # Show an indicator when the cursor is inside the class or function
+        if shown and symbol in active_scopes:
+            sub = layout.row()
+            sub.alignment = 'RIGHT'
+            sub.label(text="", icon="LAYER_ACTIVE")
+
+    def draw_function_row(self, layout, context, text, symbol, is_expanded, has_toggles, active_scopes, wm):
         row = layout.row(align=True)
         sub = row.row(align=True)  # Align the sub-row containing the operator and label
         sub.alignment = 'LEFT'
 
-        if has_class:
-            sub.label(text="", icon="BLANK1")
+        if has_toggles:
+            self.draw_toggle(sub, text, symbol, is_expanded, wm)
 
-        # Get the first word from the line
-        function = line.split(' ', 1)[1].split('(')[0]
-        function = self.truncate_text(function)
+        function = symbol.name
 
         sub = row.row()
         sub.alignment = 'LEFT'
-        sub.operator("code_map.jump", text=function, icon_value=custom_icons["function"].icon_id,
-                     emboss=False).line_number = i + 1
-        
-        if prefs.display_function_indicator:
-            if len(text.lines) > 900:
-                return
-            # Optimize AST parsing and indicator display:
-            if not hasattr(self, "_ast_cache"):
-                self._ast_cache = {}  # Cache for parsed AST trees
-
-            tree = self._ast_cache.get(text.as_string())
-            if tree is None:
-                try:
-                    tree = ast.parse(text.as_string())
-                    self._ast_cache[text.as_string()] = tree  # Store parsed tree in cache
-                except (SyntaxError, IndentationError, ValueError, TypeError,
-                        OverflowError, ModuleNotFoundError, AttributeError, MemoryError, RecursionError):
-                    pass
-
-            func_node = {}  # Initialize func_node as an empty dictionary
-            if tree is not None:
-                func_node = {node.name: (node.lineno, node.end_lineno) for node in ast.walk(tree) if isinstance(node, ast.FunctionDef)}
-                        
-            # Check if the current line index is within the lines of the class
-            current_line_index = text.current_line_index
-            if function in func_node and func_node[function][0] <= current_line_index + 1 <= func_node[function][1]:
-                sub = row.row()
-                sub.alignment = 'RIGHT'
-                sub.label(text="", icon="LAYER_ACTIVE")
-
-    def draw_class_row(self, layout, context, text, class_name, base_class, has_methods, is_class_name, i, wm):
-        prefs = context.preferences.addons[__package__].preferences
-
-        try:
-            code_element_type = self.get_class_type(class_name, base_class)
-        except Exception as e:
-            code_element_type = "UNKNOWN"
+        sub.operator("code_map.jump", text=self.truncate_text(function), icon_value=custom_icons["function"].icon_id,
+                     emboss=False).line_number = symbol.lineno
 
-        if prefs.code_filter_type == "ALL" or prefs.code_filter_type == code_element_type:
-            row = layout.row(align=True)
-            sub = row.row(align=True)  # Align the sub-row containing the operator and label
-            sub.alignment = 'LEFT'
+        self.draw_active_indicator(row, context, symbol, active_scopes)
 
-            icon = 'BLANK1' if not has_methods else 'DOWNARROW_HLT' if is_class_name else 'RIGHTARROW'
-
-            # Dynamically show an arrow icon for classes with functions,
-            # or a blank icon if the class has no functions
-            prop = sub.operator("code_map.toggle_string", text="", icon=icon, emboss=False)
-            prop.data_path = "window_manager.display_def_lines"
-            prop.value = class_name
+    def draw_class_row(self, layout, context, text, symbol, is_expanded, active_scopes, wm):
+        row = layout.row(align=True)
+        sub = row.row(align=True)  # Align the sub-row containing the operator and label
+        sub.alignment = 'LEFT'
 
-            if wm.search.strip():
-                sub.enabled = False
+        self.draw_toggle(sub, text, symbol, is_expanded, wm)
 
-            sub = row.row()
-            sub.alignment = 'LEFT'
-            sub.operator("code_map.jump", text=class_name, icon_value=custom_icons["class"].icon_id,
-                         emboss=False).line_number = i + 1
-
-            if prefs.display_class_indicator:
-                if len(text.lines) > 900:
-                    return
-                # Optimize AST parsing and indicator display:
-                if not hasattr(self, "_ast_cache"):
-                    self._ast_cache = {}  # Cache for parsed AST trees
-
-                tree = self._ast_cache.get(text.as_string())
-                if tree is None:
-                    try:
-                        tree = ast.parse(text.as_string())
-                        self._ast_cache[text.as_string()] = tree  # Store parsed tree in cache
-                    except (SyntaxError, IndentationError, ValueError, TypeError,
-                            OverflowError, ModuleNotFoundError, AttributeError, MemoryError, RecursionError):
-                        pass
-
-                class_node = None
-                if tree is not None:
-                    # Find the node corresponding to the current class
-                    class_node = next((node for node in ast.walk(tree) if isinstance(node, ast.ClassDef) and node.name == class_name), None)
-                    
-                # Check if the current line index is within the lines of the class
-                current_line_index = context.space_data.text.current_line_index
-                if class_node and class_node.lineno <= current_line_index + 1 <= class_node.end_lineno:
-                    sub = row.row()
-                    sub.alignment = 'RIGHT'
-                    sub.label(text="", icon="LAYER_ACTIVE")
-
-    def draw_property_row(self, layout, text, line, i):
-        properties = [
-            "BoolProperty", "BoolVectorProperty", "CollectionProperty",
-            "EnumProperty", "FloatProperty", "FloatVectorProperty",
-            "IntProperty", "IntVectorProperty", "PointerProperty",
-            "RemoveProperty", "StringProperty"
-        ]
-
-        if any(keyword in line for keyword in properties):
-            row = layout.row(align=True)
-            row.alignment = 'LEFT'
-            row.label(text=self.get_indentation(bpy.app.version))
+        sub = row.row()
+        sub.alignment = 'LEFT'
+        sub.operator("code_map.jump", text=symbol.name, icon_value=custom_icons["class"].icon_id,
+                     emboss=False).line_number = symbol.lineno
 
-            # Get the first word from the line
-            variable = line.split()[0].split(':')[0]
-            variable = self.truncate_text(variable)
+        self.draw_active_indicator(row, context, symbol, active_scopes)
 
-            row.operator("code_map.jump", text=variable, icon_value=custom_icons["property"].icon_id,
-                         emboss=False).line_number = i + 1
+    def draw_nested_row(self, layout, context, text, symbol, is_expanded, active_scopes, wm):
+        row = layout.row(align=True)
+        sub = row.row(align=True)
+        sub.alignment = 'LEFT'
 
+        # One icon width per level, lining the row up under its parent's name
+        for _ in range(symbol.depth):
+            sub.label(text="", icon="BLANK1")
 
-    def draw_class_function_row(self, layout, text, line, i):
-        row = layout.row(align=True)
-        row.alignment = 'LEFT'
-        row.label(text=self.get_indentation(bpy.app.version))
+        if symbol.has_children:
+            self.draw_toggle(sub, text, symbol, is_expanded, wm)
 
-        # Get the second word from the line
-        method = line.split(' ', 1)[1].split('(')[0].replace("def ", "").strip()
-        method = self.truncate_text(method)
+        sub = row.row()
+        sub.alignment = 'LEFT'
+        sub.operator("code_map.jump", text=self.truncate_text(symbol.name),
+                     icon_value=custom_icons[SYMBOL_ICONS[symbol.kind]].icon_id,
+                     emboss=False).line_number = symbol.lineno
 
-        row.operator("code_map.jump", text=method, icon_value=custom_icons["method"].icon_id,
-                     emboss=False).line_number = i + 1
+        if symbol.kind in symbol_index.SCOPE_KINDS:
+            self.draw_active_indicator(row, context, symbol, active_scopes)
 
 
 # -------------------------------------------------------------
@@ -437,6 +825,66 @@ class CODE_MAP_OT_popup(Operator):
         draw_helper.draw(layout, context, text, wm)
 
 
+class CODE_MAP_OT_workspace_symbols(Operator):
+    bl_idname = "code_map.workspace_symbols"
+    bl_label = "Go to Symbol in Workspace"
+    bl_description = "Search the classes, functions and variables of every text block"
+
+    # Most results listed in the popup
+    max_results = 40
+
+    @classmethod
+    def poll(cls, context):
+        prefs = bpy.context.preferences.addons[__package__].preferences
+        return prefs.enable_code_map and bpy.data.texts
+
+    def execute(self, context):
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        return context.window_manager.invoke_popup(self, width=400)
+
+    def draw(self, context):
+        load_icons()
+
+        layout = self.layout
+        wm = context.window_manager
+
+        layout.label(text="Go to Symbol in Workspace", icon="VIEWZOOM")
+
+        row = layout.row()
+        row.activate_init = True
+        row.prop(wm, "code_map_workspace_search", text="", icon="VIEWZOOM")
+
+        query = wm.code_map_workspace_search.strip()
+        if not query:
+            layout.label(text=f"Search {len(bpy.data.texts)} text blocks")
+            return
+
+        results = search_workspace(query)
+        if not results:
+            layout.label(text="No matches found")
+            return
+
+        for text_name, symbol in results[:self.max_results]:
+            row = layout.row(align=True)
+
+            sub = row.row()
+            sub.alignment = 'LEFT'
+            prop = sub.operator("code_map.jump", text=symbol.name, emboss=False,
+                                icon_value=custom_icons[SYMBOL_ICONS[symbol.kind]].icon_id)
+            prop.line_number = symbol.lineno
+            prop.text_name = text_name
+
+            sub = row.row()
+            sub.alignment = 'RIGHT'
+            sub.active = False
+            sub.label(text=f"{text_name}:{symbol.lineno}")
+
+        if len(results) > self.max_results:
+            layout.label(text=f"{len(results) - self.max_results} more, refine the search")
+
+
 class CODE_MAP_PT_panel(Panel):
     bl_idname = "CODE_MAP_PT_panel"
     bl_label = "Code Map"
@@ -464,8 +912,10 @@ class CODE_MAP_PT_panel(Panel):
 
 classes = [
     CODE_MAP_OT_jump,
+    CODE_MAP_OT_page,
     CODE_MAP_OT_dynamic_toggle,
     CODE_MAP_OT_popup,
+    CODE_MAP_OT_workspace_symbols,
 ]
 
 
@@ -479,7 +929,11 @@ def register():
         WindowManager.code_map_properties = PointerProperty(type=CODE_MAP_PG_properties)
 
         WindowManager.search = StringProperty(
-            name="Search", description="Search for class, funcion, variable amd method")
+            name="Search", description="Search for class, funcion, variable amd method",
+            update=reset_page)
+
+        WindowManager.code_map_workspace_search = StringProperty(
+            name="Search", description="Search for a symbol in every text block")
     except:
         pass
 
@@ -493,8 +947,28 @@ def register():
         kmi = km.keymap_items.new(CODE_MAP_OT_popup.bl_idname, 'ACCENT_GRAVE', 'PRESS')
         addon_keymaps.append((km, kmi))
 
+        kmi = km.keymap_items.new(CODE_MAP_OT_workspace_symbols.bl_idname, 'ACCENT_GRAVE', 'PRESS', shift=True)
+        addon_keymaps.append((km, kmi))
+
+    bpy.types.TEXT_HT_footer.append(breadcrumb)
+
+    global minimap_handler
+    if minimap_handler is None:
+        minimap_handler = bpy.types.SpaceTextEditor.draw_handler_add(draw_minimap, (), 'WINDOW', 'POST_PIXEL')
+
 
 def unregister():
+    global parse_executor, parse_process, minimap_handler
+
+    bpy.types.TEXT_HT_footer.remove(breadcrumb)
+
+    if minimap_handler is not None:
+        bpy.types.SpaceTextEditor.draw_handler_remove(minimap_handler, 'WINDOW')
+        minimap_handler = None
+    minimap_batches.clear()
+    free_shaders()
+    minimap_view["batch"] = None
+
     for cls in reversed(classes):
         bpy.utils.unregister_class(cls)
 
@@ -502,6 +976,7 @@ def unregister():
     del WindowManager.code_map_properties
     del WindowManager.display_def_lines
     del WindowManager.search
+    del WindowManager.code_map_workspace_search
 
     for km, kmi in addon_keymaps:
         km.keymap_items.remove(kmi)
@@ -509,4 +984,20 @@ def unregister():
 
     unload_icons()
 
+    if bpy.app.timers.is_registered(apply_parsed_indexes):
+        bpy.app.timers.unregister(apply_parsed_indexes)
+    if parse_executor is not None:
+        parse_executor.shutdown(wait=False)
+        parse_executor = None
+    if parse_process:
+        parse_process.shutdown(wait=False, cancel_futures=True)
+    parse_process = None
+    pending_parses.clear()
+    files_to_cache.clear()
+
+    symbol_indexes.clear()
+    expanded_paths["count"] = -1
+    workspace_search.update(query=None, indexes=[], results=[])
+    symbol_index.ast_cache.clear()
+
     bpy.utils.unregister_class(CODE_MAP_PT_panel)
@@ -0,0 +1,76 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+"""Drawing helpers shared by the Code Map minimap and the Find & Replace
+match highlights in the text editor.
+"""
+
+import bpy
+import gpu
+
+from gpu_extras.batch import batch_for_shader
+
+
+shaders = {}
+
+
+def redraw_text_editors(self=None, context=None):
+    """Tag every text editor for redraw, also usable as a property update."""
+    for window in bpy.context.window_manager.windows:
+        for area in window.screen.areas:
+            if area.type == 'TEXT_EDITOR':
+                area.tag_redraw()
+
+
+def get_shader(name):
+    """Built-in shader by its name since 3.4, as "UNIFORM_COLOR"."""
+    shader = shaders.get(name)
+    if shader is None:
+        # The 2D_ and 3D_ variants of the built-in shaders were merged in 3.4
+        builtin = name if bpy.app.version >= (3, 4, 0) else "2D_" + name
+        shader = shaders[name] = gpu.shader.from_builtin(builtin)
+    return shader
+
+
+def tris_batch(name, positions, colors=None):
+    """Triangle batch of 2D ``positions`` for the built-in shader ``name``."""
+    # The merged shaders take 3D positions
+    if bpy.app.version >= (3, 4, 0):
+        positions = [(x, y, 0.0) for x, y in positions]
+
+    attributes = {"pos": positions}
+    if colors is not None:
+        attributes["color"] = colors
+    return batch_for_shader(get_shader(name), 'TRIS', attributes)
+
+
+def add_rect(positions, colors, x1, y1, x2, y2, color=None):
+    positions += ((x1, y1), (x2, y1), (x2, y2), (x1, y1), (x2, y2), (x1, y2))
+    if colors is not None:
+        colors += (color,) * 6
+
+
+def prune_removed_texts(cache):
+    """Drop the entries of a cache keyed by text name whose text was removed."""
+    if len(cache) > len(bpy.data.texts):
+        for name in set(cache) - set(bpy.data.texts.keys()):
+            del cache[name]
+
+
+def free_shaders():
+    shaders.clear()
@@ -18,93 +18,222 @@
 
 
 import bpy
+import gpu
+import multiprocessing
 import os
+import re
+import sys
+import traceback
 
-from bpy.types import Operator, Panel
+from bisect import bisect_left
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from bpy.types import Operator, Panel, WindowManager
+from bpy.props import BoolProperty, IntProperty, StringProperty
 from bpy.app.translations import (
     contexts as i18n_contexts,
     pgettext_iface as iface_,
 )
 
+from . import open_recent, search_index
+from .editor_draw import add_rect, free_shaders, get_shader, prune_removed_texts, redraw_text_editors, tris_batch
+
 
 # ------------------------------
 
 
+# Last match index of every text, keyed by the text name
+match_indexes = {}
+
+
+def search_options(context):
+    """The find text and the (match case, regex, whole word) options of the editor."""
+    st = context.space_data
+    wm = context.window_manager
+    return st.find_text, st.use_match_case, wm.use_find_regex, wm.use_find_whole_word
+
+
+def get_match_index(context, text):
+    """Return the matches of the find text in ``text``.
+
+    The count label, find next, find previous and replace all share it, and
+    it is only rebuilt when the text, the find text or an option changed.
+    """
+    prune_removed_texts(match_indexes)
+
+    source = text.as_string()
+    options = search_options(context)
+    index = match_indexes.get(text.name)
+
+    if index is None or not index.is_valid(source, *options):
+        # Typing more of the query only filters the previous matches
+        refined = index.refine(source, *options) if index is not None else None
+        index = refined if refined is not None else search_index.MatchIndex(source, *options)
+        match_indexes[text.name] = index
+
+    return index
+
+
+def search_pattern(context):
+    """Compiled regular expression of the find text, raises ``re.error`` when it is invalid."""
+    find, match_case, _, whole_word = search_options(context)
+    return search_index.compile_pattern(find, match_case, whole_word)
+
+
+def select_match(context, text_data, line_index, character_index, length):
+    lines_displayed = context.area.height // 16
+
+    text_data.current_line_index = line_index
+    text_data.current_character = character_index + length
+    text_data.select_set(line_index, character_index, line_index, character_index + length)
+
+    st = context.space_data
+    if line_index < st.top or line_index > st.top + lines_displayed:
+        st.top = max(0, line_index - lines_displayed // 2)
+
+
+class TEXT_OT_find_next(Operator):
+    bl_idname = "text.find_next"
+    bl_label = "Find Next"
+    bl_description = "Find specified text"
+
+    def execute(self, context):
+        st = context.space_data
+        text_data = context.edit_text
+
+        wm = context.window_manager
+
+        # Searching through all texts is left to Blender, which only knows
+        # plain searches
+        if st.use_find_all and not (wm.use_find_regex or wm.use_find_whole_word):
+            return bpy.ops.text.find()
+
+        if text_data is not None:
+            find = st.find_text
+            index = get_match_index(context, text_data)
+
+            # Continue after the current match or selection
+            match = index.next_match(text_data.select_end_line_index, text_data.select_end_character,
+                                     wrap=st.use_find_wrap)
+
+            if index.error:
+                self.report({'WARNING'}, "Invalid pattern: {}".format(index.error))
+            elif match is None:
+                self.report({'WARNING'}, "Text not found: {}".format(find))
+            else:
+                select_match(context, text_data, *match)
+
+        return {'FINISHED'}
+
+
 class TEXT_OT_find_previous(Operator):
     bl_idname = "text.find_previous"
     bl_label = "Find Previous"
     bl_description = "Find specified text"
 
     def execute(self, context):
-        text_data = bpy.context.edit_text
+        st = context.space_data
+        text_data = context.edit_text
 
         if text_data is not None:
-            cursor_line = text_data.current_line_index
-            cursor_character = text_data.current_character
-            find = bpy.context.space_data.find_text
-
-            lines_displayed = bpy.context.area.height // 16
+            find = st.find_text
+            index = get_match_index(context, text_data)
 
-            # Start the search from the cursor position
-            found = self.search_from_cursor(text_data, cursor_line, cursor_character, find, lines_displayed)
+            # Start from the cursor, going round to the bottom of the text
+            match = index.previous_match(text_data.current_line_index, text_data.current_character)
 
-            # If the word was not found, start the search from the bottom of the text
-            if not found:
-                found = self.search_from_bottom(text_data, cursor_line, find, lines_displayed)
-
-            if not found:
+            if index.error:
+                self.report({'WARNING'}, "Invalid pattern: {}".format(index.error))
+            elif match is None:
                 self.report({'WARNING'}, "Text not found: {}".format(find))
+            else:
+                select_match(context, text_data, *match)
 
         return {'FINISHED'}
 
-    def search_from_cursor(self, text_data, cursor_line, cursor_character, find_text, lines_displayed):
-        for i in range(cursor_line, -1, -1):
-            line = text_data.lines[i].body
-            line = line[:cursor_character] if i == cursor_line else line
 
-            if not bpy.context.space_data.use_match_case:
-                line = line.lower()
-                find_text = find_text.lower()
+class TEXT_OT_replace_match(Operator):
+    bl_idname = "text.replace_match"
+    bl_label = "Replace"
+    bl_options = {'REGISTER', 'UNDO'}
 
-            index = line.rfind(find_text)
+    all: BoolProperty(name="Replace All", description="Replace every match in the text")
 
-            if index != -1:
-                self.update_text_data(text_data, i, index, find_text, lines_displayed)
-                return True
+    @classmethod
+    def description(cls, context, properties):
+        if properties.all:
+            return ("Replace all matches at once, with a single undo step. "
+                    "With Regex, group references like \\1 are expanded")
+        return "Replace the selected match and find the next one"
 
-        return False
+    def execute(self, context):
+        text_data = context.edit_text
+        if text_data is None:
+            return {'CANCELLED'}
 
-    def search_from_bottom(self, text_data, cursor_line, find_text, lines_displayed):
-        for i in range(len(text_data.lines) - 1, cursor_line, -1):
-            line = text_data.lines[i].body
+        if self.all:
+            return self.replace_all(context, text_data)
 
-            if not bpy.context.space_data.use_match_case:
-                line = line.lower()
-                find_text = find_text.lower()
+        try:
+            self.replace_selected(context, text_data)
+        except re.error as error:
+            self.report({'ERROR'}, "Invalid pattern: {}".format(error))
+            return {'CANCELLED'}
 
-            index = line.rfind(find_text)
+        bpy.ops.text.find_next()
+        return {'FINISHED'}
 
-            if index != -1:
-                self.update_text_data(text_data, i, index, find_text, lines_displayed)
-                return True
+    def replace_all(self, context, text_data):
+        st = context.space_data
+        use_regex = context.window_manager.use_find_regex
+
+        # The same matches the count label shows
+        index = get_match_index(context, text_data)
+        if index.error:
+            self.report({'ERROR'}, "Invalid pattern: {}".format(index.error))
+            return {'CANCELLED'}
+
+        if use_regex:
+            try:
+                source, count = search_index.regex_replace(index.source, search_pattern(context), st.replace_text)
+            except re.error as error:
+                self.report({'ERROR'}, "Invalid pattern: {}".format(error))
+                return {'CANCELLED'}
+        else:
+            source, count = search_index.replace_matches(index, st.replace_text)
 
-        return False
+        if count:
+            top = st.top
+            cursor = (text_data.current_line_index, text_data.current_character)
 
-    def update_text_data(self, text_data, line_index, character_index, find_text, lines_displayed):
-        text_data.current_line_index = line_index
-        text_data.current_character = character_index + len(find_text)
-        text_data.select_set(line_index, character_index, line_index, character_index + len(find_text))
+            # One write for the whole text
+            text_data.from_string(source)
 
-        if line_index < bpy.context.space_data.top or line_index > bpy.context.space_data.top + lines_displayed:
-            bpy.context.space_data.top = max(0, line_index - lines_displayed // 2)
+            line = min(cursor[0], len(text_data.lines) - 1)
+            character = min(cursor[1], len(text_data.lines[line].body))
+            text_data.select_set(line, character, line, character)
+            st.top = top
 
-        # Extract the found word from the original line
-        found_word = text_data.lines[line_index].body[character_index:character_index + len(find_text)]
+        self.report({'INFO'}, "Replaced {} matches".format(count))
+        return {'FINISHED'}
 
-    def report_warning(self, message):
-        self.report({'WARNING'}, message)
+    def replace_selected(self, context, text_data):
+        st = context.space_data
+        index = get_match_index(context, text_data)
 
-        return {'FINISHED'}
+        line, column = text_data.current_line_index, text_data.current_character
+        match = index.next_match(line, column, wrap=False)
+
+        # Only a selection covering exactly one match is replaced
+        if (match is None or match[:2] != (line, column)
+                or (text_data.select_end_line_index, text_data.select_end_character) != (line, column + match[2])):
+            return
+
+        if context.window_manager.use_find_regex:
+            found = search_pattern(context).match(text_data.lines[line].body, column)
+            text_data.write(found.expand(st.replace_text))
+        else:
+            text_data.write(st.replace_text)
 
 
 # ------------------------------
@@ -166,10 +295,20 @@ class TEXT_OT_find_replace(Operator):
         self.draw_find_repalce(st, scene, layout)
 
     def draw_settings(self, st, scene, layout):
+        wm = bpy.context.window_manager
+
         row = layout.row(align=True)
         row.prop(st, "use_match_case", text="Case", toggle=True)
+        row.prop(wm, "use_find_whole_word", text="Word", toggle=True)
         row.prop(st, "use_find_wrap", text="Wrap", toggle=True)
-        row.prop(st, "use_find_all", text="All", toggle=True)
+        row.prop(wm, "use_find_regex", text="Regex", toggle=True)
+
+        # Regex and whole word searches only look in the current text
+        sub = row.row(align=True)
+        sub.active = not (wm.use_find_regex or wm.use_find_whole_word)
+        sub.prop(st, "use_find_all", text="All", toggle=True)
+
+        row.prop(wm, "use_find_highlight", text="", icon='OUTLINER_OB_LIGHT')
         layout.separator()
 
     def draw_find_repalce(self, st, scene, layout):
@@ -183,14 +322,18 @@ class TEXT_OT_find_replace(Operator):
             sub.activate_init = True
         sub.prop(st, "find_text", icon='VIEWZOOM', text="")
 
-        row.operator("text.find", text="", icon="SORT_ASC")
+        row.operator("text.find_next", text="", icon="SORT_ASC")
         row.operator("text.find_previous", text="", icon="SORT_DESC")
 
         row = layout.row(align=True)
         row.prop(st, "replace_text", icon='DECORATE_OVERRIDE', text="")
         row.scale_x = 1.1
-        row.operator("text.replace", text="", icon="ARROW_LEFTRIGHT")
-        row.operator("text.replace", text="", icon="ANIM").all = True
+
+        # Blender's own replace only knows plain searches
+        wm = bpy.context.window_manager
+        replace = "text.replace_match" if wm.use_find_regex or wm.use_find_whole_word else "text.replace"
+        row.operator(replace, text="", icon="ARROW_LEFTRIGHT")
+        row.operator("text.replace_match", text="", icon="ANIM").all = True
 
     def display_word_count(self, context, col, find):
         text = context.space_data.text
@@ -200,30 +343,18 @@ class TEXT_OT_find_replace(Operator):
         total_count, find_count = self.count_occurrences(text, text_data, find)
 
         if prefs.display_count_label:
-            if find_count == 0 and total_count == 0:
+            if match_indexes[text_data.name].error:
+                col.label(text="Invalid pattern", icon='ERROR')
+            elif find_count == 0 and total_count == 0:
                 col.label(text="No matches found")
             else:
                 col.label(text=f"{find_count} of {total_count}")
 
     def count_occurrences(self, text, text_data, find):
-        total_count = 0
-        find_count = 0
-
-        for i, line in enumerate(text_data.lines):
-            line_body = line.body
-            find_text = find
-
-            if not bpy.context.space_data.use_match_case:
-                line_body = line.body.lower()
-                find_text = find.lower()
-
-            line_occurrences = line_body.count(find_text)
-            total_count += line_occurrences
+        index = get_match_index(bpy.context, text_data)
 
-            if i == text_data.current_line_index:
-                find_count += line_body[:text_data.select_end_character].count(find_text)
-            elif i < text_data.current_line_index:
-                find_count += line_occurrences
+        total_count = len(index)
+        find_count = index.count_before(text_data.current_line_index, text_data.select_end_character)
 
         return total_count, find_count
 
@@ -247,7 +378,7 @@ class TEXT_PT_find(Panel):
         row.prop(st, "find_text", icon='VIEWZOOM', text="")
         row.operator("text.find_set_selected", text="", icon='EYEDROPPER')
         row = col.row(align=True)
-        row.operator("text.find")
+        row.operator("text.find_next")
         row.operator("text.find_previous")
 
         layout.separator()
@@ -258,9 +389,12 @@ class TEXT_PT_find(Panel):
         row.prop(st, "replace_text", icon='DECORATE_OVERRIDE', text="")
         row.operator("text.replace_set_selected", text="", icon='EYEDROPPER')
 
+        # Blender's own replace only knows plain searches
+        wm = context.window_manager
+        replace = "text.replace_match" if wm.use_find_regex or wm.use_find_whole_word else "text.replace"
         row = col.row(align=True)
-        row.operator("text.replace")
-        row.operator("text.replace", text="Replace All").all = True
+        row.operator(replace, text="Replace")
+        row.operator("text.replace_match", text="Replace All").all = True
 
         layout.separator()
 
@@ -275,19 +409,679 @@ class TEXT_PT_find(Panel):
         row.prop(st, "use_find_all", text="All", toggle=True)
 
 
+# ------------------------------
+
+HIGHLIGHT_COLOR = (1.0, 0.75, 0.2, 0.3)
+
+highlight_handler = None
+highlight_batches = {}  # text name -> (key, batch)
+
+
+def get_line_height(context, st):
+    """Pixels between two rows of the editor."""
+    if not st.show_word_wrap and len(st.text.lines) > 1:
+        return st.region_location_from_cursor(0, 0)[1] - st.region_location_from_cursor(1, 0)[1]
+
+    system = context.preferences.system
+    return int(1.3 * st.font_size * system.ui_scale * system.pixel_size)
+
+
+def build_highlight_batch(context, st, index, first_line, last_line):
+    """One batch with a rectangle per match on the lines from ``first_line`` to ``last_line``.
+
+    Only these lines are looked up in the match index and located in the
+    region, so the cost follows the matches in view, not in the text.
+    """
+    region = context.region
+    line_height = get_line_height(context, st)
+    if line_height <= 0:
+        return None
+
+    # Locations are at the bottom of the characters, which take up about
+    # 1 / 1.3 of a row, center the rectangles on them
+    bottom = line_height * 0.15 / 1.3
+    top = line_height - bottom
+
+    positions = []
+    i = bisect_left(index.positions, (first_line, 0))
+
+    while i < len(index.positions):
+        line, column, length = index.match(i)
+        i += 1
+        if line > last_line:
+            break
+
+        x1, y1 = st.region_location_from_cursor(line, column)
+        x2, y2 = st.region_location_from_cursor(line, column + length)
+        if y1 < -line_height or y1 > region.height:
+            continue
+        if y2 != y1:
+            # The match wraps onto the next row, mark the first one
+            x2 = region.width
+
+        add_rect(positions, None, x1, y1 - bottom, x2, y1 + top)
+
+    if not positions:
+        return None
+    return tris_batch("UNIFORM_COLOR", positions)
+
+
+def draw_match_highlights():
+    context = bpy.context
+    st = context.space_data
+    text = st.text
+    if text is None or not st.find_text or not context.window_manager.use_find_highlight:
+        return
+
+    index = get_match_index(context, text)
+    if not index.positions:
+        return
+
+    region = context.region
+    # Wrapped rows do not map to lines, look from the start of the text
+    first_line = 0 if st.show_word_wrap else st.top
+    last_line = st.top + st.visible_lines
+
+    # The location of the top line follows horizontal scrolling, the font
+    # size and the line numbers, so it is part of what the batch is kept for
+    origin = tuple(st.region_location_from_cursor(min(st.top, len(text.lines) - 1), 0))
+    key = (index, st.top, st.visible_lines, origin, region.width, region.height, st.show_word_wrap)
+
+    cached = highlight_batches.get(text.name)
+    if cached is None or cached[0] != key:
+        cached = highlight_batches[text.name] = (key, build_highlight_batch(context, st, index, first_line, last_line))
+
+    prune_removed_texts(highlight_batches)
+
+    batch = cached[1]
+    if batch is None:
+        return
+
+    if hasattr(gpu, "state"):
+        gpu.state.blend_set('ALPHA')
+
+    shader = get_shader("UNIFORM_COLOR")
+    shader.bind()
+    shader.uniform_float("color", HIGHLIGHT_COLOR)
+    batch.draw(shader)
+
+    if hasattr(gpu, "state"):
+        gpu.state.blend_set('NONE')
+
+
+# ------------------------------
+
+# Rows listed per text in the Find in Texts popup, and in total
+MAX_TEXT_HITS = 20
+MAX_HITS = 200
+
+# Seconds between checks for finished text searches
+SEARCH_POLL_INTERVAL = 0.05
+
+search_executor = None
+
+# State of the last Find in Texts search. ``results`` keeps the submission
+# order, one (name, filepath, hits) entry per text, None until it is done.
+text_search = {"futures": [], "jobs": [], "results": [], "pending": 0, "query": ""}
+
+
+def draw_search_results(layout, results):
+    """Boxes of (name, filepath, hits) results, with a jump button per hit."""
+    shown = 0
+    for name, filepath, hits in results:
+        if shown >= MAX_HITS:
+            layout.label(text="More results not shown, refine the search")
+            break
+
+        box = layout.box()
+        row = box.row()
+        row.label(text=name, icon="FILE" if filepath else "TEXT")
+        sub = row.row()
+        sub.alignment = 'RIGHT'
+        sub.label(text=str(len(hits)))
+
+        col = box.column(align=True)
+        for line, column, length, body in hits[:min(MAX_TEXT_HITS, MAX_HITS - shown)]:
+            snippet = body.strip()
+            if len(snippet) > 60:
+                snippet = snippet[:60] + "..."
+
+            prop = col.operator("text.find_in_texts_jump", text=f"{line + 1}: {snippet}", emboss=False)
+            prop.text_name = "" if filepath else name
+            prop.filepath = filepath
+            prop.line = line
+            prop.column = column
+            prop.length = length
+            shown += 1
+
+        if len(hits) > MAX_TEXT_HITS:
+            col.label(text=f"{len(hits) - MAX_TEXT_HITS} more in this text")
+
+
+def start_text_search(context):
+    """Search every text block, and the Open Recent files when enabled, on worker threads.
+
+    Text contents are copied on the main thread, files are read by the
+    workers. Results are picked up by a timer.
+    """
+    global search_executor
+    if search_executor is None:
+        search_executor = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1),
+                                             thread_name_prefix="find_in_texts")
+
+    cancel_text_search()
+
+    options = search_options(context)
+    text_search["query"] = options[0]
+
+    jobs = []
+    open_files = set()
+    for text in bpy.data.texts:
+        jobs.append((text.name, "", search_index.search_text, text.as_string()))
+        if text.filepath:
+            open_files.add(os.path.normpath(bpy.path.abspath(text.filepath)))
+
+    if context.window_manager.find_in_recent_files:
+        _, _, txt_path = open_recent.get_recent_list()
+        if os.path.exists(txt_path):
+            with open(txt_path, 'r') as txt_file:
+                for filepath in dict.fromkeys(line.strip() for line in txt_file):
+                    if filepath and os.path.normpath(filepath) not in open_files:
+                        jobs.append((os.path.basename(filepath), filepath, search_index.search_file, filepath))
+
+    text_search["results"] = [None] * len(jobs)
+    text_search["futures"] = [search_executor.submit(function, source, *options)
+                              for _, _, function, source in jobs]
+    text_search["jobs"] = [(name, filepath) for name, filepath, _, _ in jobs]
+    text_search["pending"] = len(jobs)
+
+    if not bpy.app.timers.is_registered(collect_text_search):
+        bpy.app.timers.register(collect_text_search, first_interval=SEARCH_POLL_INTERVAL)
+
+
+def cancel_text_search():
+    for future in text_search["futures"]:
+        future.cancel()
+    text_search["futures"] = []
+    text_search["pending"] = 0
+
+
+def collect_text_search():
+    """Timer moving finished text searches into the results on the main thread."""
+    futures = text_search["futures"]
+
+    for i, future in enumerate(futures):
+        if future is None or not future.done():
+            continue
+
+        futures[i] = None
+        text_search["pending"] -= 1
+        name, filepath = text_search["jobs"][i]
+        try:
+            text_search["results"][i] = (name, filepath, future.result())
+        except Exception:
+            text_search["results"][i] = (name, filepath, [])
+
+    redraw_text_editors()
+    return SEARCH_POLL_INTERVAL if text_search["pending"] > 0 else None
+
+
+def draw_text_search(layout):
+    results = [result for result in text_search["results"] if result is not None and result[2]]
+    total = sum(len(hits) for _, _, hits in results)
+
+    if text_search["pending"] > 0:
+        layout.label(text=f"Searching... {total} matches so far", icon="SORTTIME")
+    elif text_search["query"]:
+        layout.label(text=f"{total} matches in {len(results)} texts" if total else "No matches found")
+
+    draw_search_results(layout, results)
+
+
+class TEXT_OT_find_in_texts(Operator):
+    bl_idname = "text.find_in_texts"
+    bl_label = "Find in Texts"
+    bl_description = "Search all text blocks, and optionally the Open Recent files, for the find text"
+
+    def execute(self, context):
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        return context.window_manager.invoke_popup(self, width=450)
+
+    def draw(self, context):
+        layout = self.layout
+        st = context.space_data
+        wm = context.window_manager
+
+        layout.label(text="Find in Texts", icon="DOCUMENTS")
+
+        row = layout.row(align=True)
+        sub = row.row(align=True)
+        sub.activate_init = True
+        sub.prop(st, "find_text", icon='VIEWZOOM', text="")
+        row.operator("text.find_in_texts_search", text="", icon="PLAY")
+
+        row = layout.row(align=True)
+        row.prop(st, "use_match_case", text="Case", toggle=True)
+        row.prop(wm, "use_find_whole_word", text="Word", toggle=True)
+        row.prop(wm, "use_find_regex", text="Regex", toggle=True)
+        row.prop(wm, "find_in_recent_files", text="Recent Files", toggle=True)
+
+        layout.separator()
+        draw_text_search(layout)
+
+
+class TEXT_OT_find_in_texts_search(Operator):
+    bl_idname = "text.find_in_texts_search"
+    bl_label = "Search"
+    bl_description = "Search all texts for the find text"
+    bl_options = {'INTERNAL'}
+
+    def execute(self, context):
+        if not context.space_data.find_text:
+            return {'CANCELLED'}
+
+        if context.window_manager.use_find_regex:
+            try:
+                search_pattern(context)
+            except re.error as error:
+                self.report({'ERROR'}, "Invalid pattern: {}".format(error))
+                return {'CANCELLED'}
+
+        start_text_search(context)
+
+        # Popups only redraw on events, the sidebar lists the hits as they come in
+        context.space_data.show_region_ui = True
+        return {'FINISHED'}
+
+
+class TEXT_PT_find_in_texts(Panel):
+    bl_space_type = 'TEXT_EDITOR'
+    bl_region_type = 'UI'
+    bl_category = "Text"
+    bl_label = "Find in Texts"
+
+    @classmethod
+    def poll(cls, context):
+        return bool(text_search["query"])
+
+    def draw(self, context):
+        draw_text_search(self.layout)
+
+
+class TEXT_OT_find_in_texts_jump(Operator):
+    bl_idname = "text.find_in_texts_jump"
+    bl_label = "Jump to Match"
+    bl_options = {'INTERNAL'}
+
+    text_name: StringProperty()
+    filepath: StringProperty()
+    line: IntProperty()
+    column: IntProperty()
+    length: IntProperty()
+
+    @classmethod
+    def description(cls, context, properties):
+        return "Jump to line {} of {}".format(properties.line + 1, properties.text_name or properties.filepath)
+
+    def execute(self, context):
+        st = context.space_data
+
+        if self.filepath:
+            # Files that were opened since the search are reused
+            for text in bpy.data.texts:
+                if text.filepath and os.path.normpath(bpy.path.abspath(text.filepath)) == os.path.normpath(self.filepath):
+                    st.text = text
+                    break
+            else:
+                if not os.path.isfile(self.filepath):
+                    self.report({'WARNING'}, f"Cannot read file \"{self.filepath}\": No such file or directory.")
+                    return {'CANCELLED'}
+                bpy.ops.text.open(filepath=self.filepath)
+        else:
+            text = bpy.data.texts.get(self.text_name)
+            if text is None:
+                self.report({'WARNING'}, f"Text not found: {self.text_name}")
+                return {'CANCELLED'}
+            st.text = text
+
+        text_data = st.text
+        line = min(self.line, len(text_data.lines) - 1)
+        bpy.ops.text.jump(line=line + 1)
+        select_match(context, text_data, line, self.column, self.length)
+        return {'FINISHED'}
+
+
+# ------------------------------
+
+# Files searched by one task of the folder search, tasks queued at once and
+# files listed per timer tick. Files are listed between ticks, so the first
+# hits come in while the rest of the tree is still being walked.
+FILES_PER_TASK = 32
+TASKS_PER_WORKER = 4
+FILES_PER_TICK = 2000
+
+folder_executor = None
+
+# Trigram indexes of the searched folders, loaded once per session
+trigram_indexes = {}
+trigram_index_dir = os.path.join(os.path.expanduser("~/Documents/Open Recent"), "find_index")
+
+# State of the last Find in Folder search, ``walker`` is None once every
+# file below the root is queued. ``futures`` holds (future, files) pairs.
+folder_search = {"walker": None, "futures": [], "results": [], "root": "", "options": (), "files": 0,
+                 "failed": 0, "query": "", "index": None, "trigrams": set(), "batch": [], "seen": set()}
+
+
+def folder_workers():
+    return max(1, (os.cpu_count() or 2) - 1)
+
+
+def create_folder_executor():
+    """A process pool where processes can be forked, threads elsewhere.
+
+    Spawned processes would start another Blender, so platforms without a
+    safe fork search on threads, which still keeps the UI responsive.
+    """
+    if sys.platform.startswith("linux") and "fork" in multiprocessing.get_all_start_methods():
+        try:
+            return ProcessPoolExecutor(max_workers=folder_workers(),
+                                       mp_context=multiprocessing.get_context("fork"))
+        except (OSError, ValueError):
+            pass
+    return ThreadPoolExecutor(max_workers=folder_workers(), thread_name_prefix="find_in_folder")
+
+
+def get_trigram_index(root):
+    index = trigram_indexes.get(root)
+    if index is None:
+        index = trigram_indexes[root] = search_index.TrigramIndex(trigram_index_dir, root)
+        index.load()
+    return index
+
+
+def start_folder_search(context, root):
+    global folder_executor
+    if folder_executor is None:
+        folder_executor = create_folder_executor()
+
+    cancel_folder_search()
+
+    prefs = context.preferences.addons[__package__].preferences
+    ignore = search_index.compile_ignore_patterns(prefs.find_ignore_patterns)
+
+    options = search_options(context)
+    folder_search.update(walker=search_index.walk_files(root, ignore), results=[], root=root,
+                         options=options, files=0, failed=0, query=options[0], index=get_trigram_index(root),
+                         trigrams=search_index.query_trigrams(options[0], options[2]), batch=[], seen=set())
+
+    # The first tasks go out right away, the timer streams in the rest
+    if stream_folder_search() is not None and not bpy.app.timers.is_registered(stream_folder_search):
+        bpy.app.timers.register(stream_folder_search, first_interval=SEARCH_POLL_INTERVAL)
+
+
+def cancel_folder_search():
+    for future, _ in folder_search["futures"]:
+        future.cancel()
+    folder_search["futures"] = []
+    folder_search["walker"] = None
+    folder_search["batch"] = []
+    save_trigram_index()
+
+
+def save_trigram_index():
+    # The files read so far are indexed, a cancelled search keeps them too
+    index = folder_search["index"]
+    if index is not None and index.changed:
+        index.save()
+
+
+def fall_back_to_threads():
+    """Replace a process pool whose worker died, the rest of the search runs on threads."""
+    global folder_executor
+    if isinstance(folder_executor, ThreadPoolExecutor):
+        return False
+
+    broken = folder_executor
+    folder_executor = ThreadPoolExecutor(max_workers=folder_workers(), thread_name_prefix="find_in_folder")
+    broken.shutdown(wait=False, cancel_futures=True)
+    return True
+
+
+def submit_folder_task(files):
+    try:
+        future = folder_executor.submit(search_index.search_files, files, *folder_search["options"])
+    except RuntimeError:
+        if not fall_back_to_threads():
+            raise
+        future = folder_executor.submit(search_index.search_files, files, *folder_search["options"])
+    return future, files
+
+
+def stream_folder_search():
+    """Timer collecting finished folder tasks and queueing the next files.
+
+    Files the trigram index rules out are counted but never read.
+    """
+    root = folder_search["root"]
+    index = folder_search["index"]
+    queued = []
+
+    for future, files in folder_search["futures"]:
+        if not future.done():
+            queued.append((future, files))
+            continue
+        try:
+            found, filters = future.result()
+        except BrokenExecutor:
+            # A worker process died, search the files again on threads
+            fall_back_to_threads()
+            queued.append(submit_folder_task(files))
+            continue
+        except Exception:
+            traceback.print_exc()
+            folder_search["failed"] += len(files)
+            continue
+        for filepath, hits in found:
+            folder_search["results"].append((os.path.relpath(filepath, root), filepath, hits))
+        for file_filter in filters:
+            index.update(*file_filter)
+
+    walker = folder_search["walker"]
+    batch = folder_search["batch"]
+    trigrams = folder_search["trigrams"]
+    seen = folder_search["seen"]
+    listed = 0
+
+    while walker is not None and len(queued) < folder_workers() * TASKS_PER_WORKER and listed < FILES_PER_TICK:
+        item = next(walker, None)
+        if item is None:
+            folder_search["walker"] = walker = None
+            index.retain(seen)
+            break
+
+        filepath, stat = item
+        listed += 1
+        seen.add(filepath)
+        if not index.is_indexed(filepath, stat):
+            batch.append((filepath, stat.st_mtime_ns, stat.st_size))
+        elif index.is_candidate(filepath, trigrams):
+            batch.append((filepath, None, None))
+        else:
+            continue
+
+        if len(batch) == FILES_PER_TASK:
+            queued.append(submit_folder_task(batch))
+            batch = []
+
+    if walker is None and batch:
+        queued.append(submit_folder_task(batch))
+        batch = []
+
+    folder_search["files"] += listed
+    folder_search["batch"] = batch
+    folder_search["futures"] = queued
+
+    if walker is None and not queued:
+        save_trigram_index()
+
+    redraw_text_editors()
+    return SEARCH_POLL_INTERVAL if walker is not None or queued else None
+
+
+def is_folder_search_running():
+    return folder_search["walker"] is not None or bool(folder_search["futures"])
+
+
+def draw_folder_search(layout):
+    results = folder_search["results"]
+    total = sum(len(hits) for _, _, hits in results)
+    files = folder_search["files"]
+
+    if is_folder_search_running():
+        layout.label(text=f"Searching... {total} matches in {files} files so far", icon="SORTTIME")
+    elif folder_search["query"]:
+        if total:
+            layout.label(text=f"{total} matches in {len(results)} of {files} files")
+        else:
+            layout.label(text=f"No matches found in {files} files")
+
+    if folder_search["failed"]:
+        layout.label(text=f"{folder_search['failed']} files could not be searched", icon="ERROR")
+
+    draw_search_results(layout, results)
+
+
+class TEXT_OT_find_in_folder(Operator):
+    bl_idname = "text.find_in_folder"
+    bl_label = "Find in Folder"
+    bl_description = "Search the files below a folder for the find text"
+
+    def execute(self, context):
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        wm = context.window_manager
+        text = context.space_data.text
+
+        # Default to the folder of the current text
+        if not wm.find_folder and text and text.filepath:
+            wm.find_folder = os.path.dirname(bpy.path.abspath(text.filepath))
+
+        return wm.invoke_popup(self, width=450)
+
+    def draw(self, context):
+        layout = self.layout
+        st = context.space_data
+        wm = context.window_manager
+
+        layout.label(text="Find in Folder", icon="FILE_FOLDER")
+        layout.prop(wm, "find_folder", text="")
+
+        row = layout.row(align=True)
+        sub = row.row(align=True)
+        sub.activate_init = True
+        sub.prop(st, "find_text", icon='VIEWZOOM', text="")
+
+        if is_folder_search_running():
+            row.operator("text.find_in_folder_cancel", text="", icon="CANCEL")
+        else:
+            row.operator("text.find_in_folder_search", text="", icon="PLAY")
+
+        row = layout.row(align=True)
+        row.prop(st, "use_match_case", text="Case", toggle=True)
+        row.prop(wm, "use_find_whole_word", text="Word", toggle=True)
+        row.prop(wm, "use_find_regex", text="Regex", toggle=True)
+
+        layout.separator()
+        draw_folder_search(layout)
+
+
+class TEXT_OT_find_in_folder_search(Operator):
+    bl_idname = "text.find_in_folder_search"
+    bl_label = "Search"
+    bl_description = "Search the files below the folder for the find text"
+    bl_options = {'INTERNAL'}
+
+    def execute(self, context):
+        root = bpy.path.abspath(context.window_manager.find_folder)
+        if not os.path.isdir(root):
+            self.report({'WARNING'}, f"Folder not found: {root}")
+            return {'CANCELLED'}
+
+        if not context.space_data.find_text:
+            return {'CANCELLED'}
+
+        if context.window_manager.use_find_regex:
+            try:
+                search_pattern(context)
+            except re.error as error:
+                self.report({'ERROR'}, "Invalid pattern: {}".format(error))
+                return {'CANCELLED'}
+
+        start_folder_search(context, os.path.normpath(root))
+
+        # Popups only redraw on events, the sidebar lists the hits as they come in
+        context.space_data.show_region_ui = True
+        return {'FINISHED'}
+
+
+class TEXT_PT_find_in_folder(Panel):
+    bl_space_type = 'TEXT_EDITOR'
+    bl_region_type = 'UI'
+    bl_category = "Text"
+    bl_label = "Find in Folder"
+
+    @classmethod
+    def poll(cls, context):
+        return bool(folder_search["query"])
+
+    def draw(self, context):
+        layout = self.layout
+
+        if is_folder_search_running():
+            layout.operator("text.find_in_folder_cancel", icon="CANCEL")
+        draw_folder_search(layout)
+
+
+class TEXT_OT_find_in_folder_cancel(Operator):
+    bl_idname = "text.find_in_folder_cancel"
+    bl_label = "Cancel"
+    bl_description = "Stop the folder search, the matches found so far are kept"
+    bl_options = {'INTERNAL'}
+
+    def execute(self, context):
+        cancel_folder_search()
+        redraw_text_editors()
+        return {'FINISHED'}
+
+
 # ------------------------------
 
 def draw_func(self, context):
     layout = self.layout
     layout.operator("text.find_replace", text="Find & Replace Popup")
+    layout.operator("text.find_in_texts", text="Find in Texts")
+    layout.operator("text.find_in_folder", text="Find in Folder")
 
 
 # ------------------------------
 
 
 classes = [
+    TEXT_OT_find_next,
     TEXT_OT_find_previous,
+    TEXT_OT_replace_match,
     TEXT_OT_find_replace,
+    TEXT_OT_find_in_texts,
+    TEXT_OT_find_in_texts_search,
+    TEXT_OT_find_in_texts_jump,
+    TEXT_PT_find_in_texts,
+    TEXT_OT_find_in_folder,
+    TEXT_OT_find_in_folder_search,
+    TEXT_OT_find_in_folder_cancel,
+    TEXT_PT_find_in_folder,
 ]
 
 
@@ -298,6 +1092,18 @@ def register():
     for cls in classes:
         bpy.utils.register_class(cls)
 
+    WindowManager.use_find_regex = BoolProperty(
+        name="Regex", description="Search with a regular expression, replacements can use group references")
+    WindowManager.use_find_whole_word = BoolProperty(
+        name="Whole Word", description="Only find matches that are not part of a longer word")
+    WindowManager.find_in_recent_files = BoolProperty(
+        name="Recent Files", description="Also search the files of the Open Recent list that are not open")
+    WindowManager.use_find_highlight = BoolProperty(
+        name="Highlight Matches", description="Highlight every match of the find text in the editor",
+        update=lambda self, context: redraw_text_editors())
+    WindowManager.find_folder = StringProperty(
+        name="Folder", description="Folder searched by Find in Folder, including its subfolders", subtype='DIR_PATH')
+
     try:
         bpy.utils.register_class(TEXT_PT_find)
     except:
@@ -305,6 +1111,10 @@ def register():
 
     bpy.types.TEXT_MT_edit.append(draw_func)
 
+    global highlight_handler
+    if highlight_handler is None:
+        highlight_handler = bpy.types.SpaceTextEditor.draw_handler_add(draw_match_highlights, (), 'WINDOW', 'POST_PIXEL')
+
     # handle the keymap
     wm = bpy.context.window_manager
     if wm.keyconfigs.addon:
@@ -313,12 +1123,15 @@ def register():
         kmi = km.keymap_items.new('text.find_replace', 'F1', 'PRESS')
         addon_keymaps.append((km, kmi))
 
+        kmi = km.keymap_items.new('text.find_in_texts', 'F1', 'PRESS', shift=True)
+        addon_keymaps.append((km, kmi))
+
         # Keymap for find previous
         kmi = km.keymap_items.new('text.find_previous', 'UP_ARROW', 'PRESS', alt=True)
         addon_keymaps.append((km, kmi))
 
         # Keymap for find next
-        kmi = km.keymap_items.new('text.find', 'DOWN_ARROW', 'PRESS', alt=True)
+        kmi = km.keymap_items.new('text.find_next', 'DOWN_ARROW', 'PRESS', alt=True)
         addon_keymaps.append((km, kmi))
 
 
@@ -326,6 +1139,36 @@ def unregister():
     for cls in classes:
         bpy.utils.unregister_class(cls)
 
+    del WindowManager.use_find_regex
+    del WindowManager.use_find_whole_word
+    del WindowManager.find_in_recent_files
+    del WindowManager.find_folder
+    del WindowManager.use_find_highlight
+
+    global highlight_handler
+    if highlight_handler is not None:
+        bpy.types.SpaceTextEditor.draw_handler_remove(highlight_handler, 'WINDOW')
+        highlight_handler = None
+    highlight_batches.clear()
+    free_shaders()
+
+    global search_executor, folder_executor
+    cancel_text_search()
+    if bpy.app.timers.is_registered(collect_text_search):
+        bpy.app.timers.unregister(collect_text_search)
+    if search_executor is not None:
+        search_executor.shutdown(wait=False)
+        search_executor = None
+    text_search.update(results=[], query="")
+
+    cancel_folder_search()
+    if bpy.app.timers.is_registered(stream_folder_search):
+        bpy.app.timers.unregister(stream_folder_search)
+    if folder_executor is not None:
+        folder_executor.shutdown(wait=False)
+        folder_executor = None
+    folder_search.update(results=[], query="")
+
     bpy.types.TEXT_MT_edit.remove(draw_func)
 
     try:
@@ -357,3 +1200,5 @@ def unregister():
     for km, kmi in addon_keymaps:
         km.keymap_items.remove(kmi)
     addon_keymaps.clear()
+
+    match_indexes.clear()
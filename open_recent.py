@@ -34,7 +34,7 @@ from bpy.props import (
     PointerProperty
 )
 
-from . import jump_to_line
+from . import code_map, jump_to_line
 
 
 class TEXT_PG_properties(PropertyGroup):
@@ -60,6 +60,13 @@ def get_recent_list():
     return list, index, txt_path
 
 
+def load_cached_index(context):
+    # Let the Code Map outline a just opened file from its disk cache
+    text = context.space_data.text
+    if text and context.preferences.addons[__package__].preferences.enable_code_map:
+        code_map.load_cached_index(text)
+
+
 def update_list():
     list, index, txt_path = get_recent_list()
     props = bpy.context.scene.recent_list_props
@@ -122,6 +129,7 @@ class TEXT_OT_open_mainfile(Operator, ImportHelper):
                 continue
 
             bpy.ops.text.open(filepath=filepath)
+            load_cached_index(context)
 
             imported_files = []
             if os.path.exists(txt_path):
@@ -188,6 +196,7 @@ class TEXT_OT_open_file(Operator):
         else:
             # The file is not open, so open it
             bpy.ops.text.open(filepath=self.filepath)
+            load_cached_index(context)
 
         if bpy.context.preferences.addons[__package__].preferences.enable_package_reordering:
             self.reorder_package_files()
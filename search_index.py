@@ -0,0 +1,611 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+"""Match index for Find & Replace.
+
+Finds every occurrence of a query in one revision of a text once, so the
+"N of M" label, find next and find previous are bisect lookups instead of
+scans over the lines. Also holds the file searches of Find in Folder and
+the trigram index that narrows them down. Nothing in here touches bpy.
+"""
+
+import hashlib
+import json
+import os
+import re
+
+from bisect import bisect_left, bisect_right
+from fnmatch import translate
+from functools import lru_cache
+from zlib import crc32
+
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
+
+
+# Compiled regular expressions kept around, typing a pattern compiles one
+# per keystroke
+PATTERN_CACHE_SIZE = 64
+
+# Global inline flags at the start of a pattern, as in "(?i)" or "(?x)"
+GLOBAL_FLAGS = re.compile(r"(?:\(\?[aiLmsux]+\))*")
+
+# Names the folder search skips, folders and files alike
+DEFAULT_IGNORE_PATTERNS = (".git, .hg, .svn, __pycache__, node_modules, .venv, venv, "
+                           "*.pyc, *.pyo, *.so, *.pyd, *.dll, *.blend, *.blend1, *.png, *.jpg, *.zip")
+
+# Bytes looked at for a NUL to tell a binary file from a text file
+BINARY_CHECK_SIZE = 8192
+
+TRIGRAM_INDEX_VERSION = 1
+
+# Size of the trigram filter of a file, in bits per distinct trigram and
+# at least. The filters of larger files fill up and let more queries through.
+FILTER_BITS_PER_TRIGRAM = 4
+MIN_FILTER_BITS = 256
+
+
+class MatchIndex:
+    """Sorted (line, column) positions of a query in ``source``.
+
+    Lines and columns are 0-based, as in ``Text.current_line_index`` and
+    ``Text.current_character``. Matches do not overlap and never span lines.
+    ``ends`` holds the (line, column) right after every match, which is
+    sorted as well, and differs from the start by more than the query
+    length when case folding expanded a character. An invalid regular
+    expression leaves the index empty with the reason in ``error``.
+    ``offsets`` holds the start of every match in ``source`` for literal
+    queries matched over the whole source, and is None otherwise.
+    """
+
+    __slots__ = ("source", "query", "options", "positions", "ends", "offsets", "error")
+
+    def __init__(self, source, query, match_case, use_regex=False, whole_word=False):
+        self.source = source
+        self.query = query
+        self.options = (match_case, use_regex, whole_word)
+        self.error = None
+
+        if not use_regex:
+            self.positions, self.ends, self.offsets = find_positions(source, query, match_case, whole_word)
+            return
+
+        self.offsets = None
+
+        try:
+            pattern = compile_pattern(query, match_case, whole_word)
+        except re.error as error:
+            self.error = str(error)
+            self.positions, self.ends = [], []
+        else:
+            self.positions, self.ends = regex_positions(source, pattern)
+
+    def is_valid(self, source, query, match_case, use_regex=False, whole_word=False):
+        return (self.query == query and self.options == (match_case, use_regex, whole_word)
+                and self.source == source)
+
+    def refine(self, source, query, match_case, use_regex=False, whole_word=False):
+        """Index of a query that extends this one, filtered from its matches.
+
+        Every match of the longer query starts where the shorter one
+        matched, as long as the shorter one can not overlap itself and the
+        text folds one character to one. Returns None when the query has to
+        be searched from scratch instead.
+        """
+        old_query = self.query
+        new_query = query
+        if (use_regex or whole_word or self.options != (match_case, False, False) or self.offsets is None
+                or not old_query or len(query) <= len(old_query) or not query.startswith(old_query)
+                or "\n" in query or self.source != source):
+            return None
+
+        if not match_case:
+            # ASCII text folds one to one, and str.isascii is a flag lookup
+            if not source.isascii():
+                return None
+            old_query = old_query.casefold()
+            query = query.casefold()
+            if not query.startswith(old_query):
+                return None
+
+        if has_border(old_query):
+            return None
+
+        length = len(query)
+        positions = []
+        ends = []
+        offsets = []
+        last = 0
+
+        for i, offset in enumerate(self.offsets):
+            if offset < last:
+                continue
+            candidate = source[offset:offset + length]
+            if (candidate if match_case else candidate.casefold()) == query:
+                line, column = self.positions[i]
+                positions.append((line, column))
+                ends.append((line, column + length))
+                offsets.append(offset)
+                last = offset + length
+
+        index = MatchIndex.__new__(MatchIndex)
+        index.source = source
+        index.query = new_query
+        index.options = self.options
+        index.positions = positions
+        index.ends = ends
+        index.offsets = offsets
+        index.error = None
+        return index
+
+    def __len__(self):
+        return len(self.positions)
+
+    def match(self, i):
+        """The i-th match as (line, column, length)."""
+        line, column = self.positions[i]
+        return line, column, self.ends[i][1] - column
+
+    def count_before(self, line, column):
+        """Number of matches ending at or before (line, column)."""
+        return bisect_right(self.ends, (line, column))
+
+    def next_match(self, line, column, wrap=True):
+        """First match starting at or after (line, column), None if there is none."""
+        i = bisect_left(self.positions, (line, column))
+        if i < len(self.positions):
+            return self.match(i)
+        if wrap and self.positions:
+            return self.match(0)
+        return None
+
+    def previous_match(self, line, column, wrap=True):
+        """Last match ending at or before (line, column), None if there is none."""
+        i = self.count_before(line, column) - 1
+        if i >= 0:
+            return self.match(i)
+        if wrap and self.positions:
+            return self.match(len(self.positions) - 1)
+        return None
+
+
+@lru_cache(maxsize=PATTERN_CACHE_SIZE)
+def compile_pattern(pattern, match_case, whole_word=False):
+    if whole_word:
+        # Same boundaries as the literal search, also for patterns that
+        # start or end with a non-word character. Global flags have to stay
+        # at the start, and a verbose comment must not swallow the ")".
+        flags = GLOBAL_FLAGS.match(pattern).group()
+        pattern = pattern[len(flags):]
+        if "x" in flags:
+            pattern += "\n"
+        pattern = r"{}(?<!\w)(?:{})(?!\w)".format(flags, pattern)
+    return re.compile(pattern, 0 if match_case else re.IGNORECASE)
+
+
+def regex_positions(source, pattern):
+    """Start and end positions of the matches of ``pattern``, one line at a time."""
+    positions = []
+    ends = []
+
+    for line_index, line in enumerate(source.split("\n")):
+        for match in pattern.finditer(line):
+            start, end = match.span()
+            # Empty matches can not be selected or counted
+            if end > start:
+                positions.append((line_index, start))
+                ends.append((line_index, end))
+
+    return positions, ends
+
+
+def replace_matches(index, replacement):
+    """Replace every match of a literal index in one pass over its source.
+
+    Returns the new source and the number of replacements, which is always
+    the count the index reports.
+    """
+    positions = index.positions
+    ends = index.ends
+    lines = index.source.split("\n")
+
+    i = 0
+    while i < len(positions):
+        line_index = positions[i][0]
+        line = lines[line_index]
+        parts = []
+        last = 0
+
+        while i < len(positions) and positions[i][0] == line_index:
+            parts.append(line[last:positions[i][1]])
+            parts.append(replacement)
+            last = ends[i][1]
+            i += 1
+
+        parts.append(line[last:])
+        lines[line_index] = "".join(parts)
+
+    return "\n".join(lines), len(positions)
+
+
+def regex_replace(source, pattern, template):
+    """Replace every match in one pass, expanding group references in ``template``.
+
+    Returns the new source and the number of replacements. Raises
+    ``re.error`` for a bad group reference.
+    """
+    count = 0
+
+    def expand(match):
+        nonlocal count
+        if match.end() == match.start():
+            return ""
+        count += 1
+        return match.expand(template)
+
+    lines = [pattern.sub(expand, line) for line in source.split("\n")]
+    return "\n".join(lines), count
+
+
+def search_text(source, query, match_case, use_regex=False, whole_word=False):
+    """Matches of one text for a search over many, as (line, column, length, line body)."""
+    index = MatchIndex(source, query, match_case, use_regex, whole_word)
+    if not index.positions:
+        return []
+
+    lines = source.split("\n")
+    return [(line, column, length, lines[line])
+            for line, column, length in map(index.match, range(len(index)))]
+
+
+def read_source(filepath):
+    """Text of a file with "\\n" line ends as in Blender, None when it can not be read.
+
+    Binary files and files that are not UTF-8 read as empty.
+    """
+    try:
+        with open(filepath, 'rb') as file:
+            data = file.read()
+    except OSError:
+        return None
+
+    if b"\0" in data[:BINARY_CHECK_SIZE]:
+        return ""
+    try:
+        return data.decode('utf-8').replace("\r\n", "\n")
+    except UnicodeDecodeError:
+        return ""
+
+
+def search_file(filepath, *options):
+    """``search_text`` over a file on disk, no matches for binary and unreadable files."""
+    source = read_source(filepath)
+    if not source:
+        return []
+    return search_text(source, *options)
+
+
+def search_files(files, *options):
+    """Search a batch of (filepath, mtime, size) files and build their trigram filters.
+
+    Returns (filepath, hits) for the files with hits and the
+    ``TrigramIndex.update`` arguments of every file that could be read,
+    leaving out files without an mtime, which are indexed already. Runs in
+    worker processes, so it only takes and returns plain data.
+    """
+    results = []
+    filters = []
+
+    for filepath, mtime, size in files:
+        source = read_source(filepath)
+        if source is None:
+            continue
+
+        if mtime is not None:
+            filters.append((filepath, mtime, size) + trigram_filter(source))
+        if source:
+            hits = search_text(source, *options)
+            if hits:
+                results.append((filepath, hits))
+
+    return results, filters
+
+
+def compile_ignore_patterns(patterns):
+    """One expression for comma separated glob patterns, None when there are none."""
+    globs = [pattern.strip() for pattern in patterns.split(",") if pattern.strip()]
+    if not globs:
+        return None
+    return re.compile("|".join(translate(glob) for glob in globs))
+
+
+def walk_files(root, ignore=None):
+    """(path, stat) of the files below ``root`` in sorted depth first order.
+
+    Names matching ``ignore`` are skipped along with everything below them,
+    so are symbolic links to folders and folders that can not be listed.
+    """
+    stack = [root]
+
+    while stack:
+        folder = stack.pop()
+        try:
+            with os.scandir(folder) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError:
+            continue
+
+        folders = []
+        for entry in entries:
+            if ignore is not None and ignore.match(entry.name):
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    folders.append(entry.path)
+                elif entry.is_file():
+                    yield entry.path, entry.stat()
+            except OSError:
+                continue
+
+        stack.extend(reversed(folders))
+
+
+class TrigramIndex:
+    """Trigram filters of the files below ``root``, kept in one JSON file.
+
+    A filter is a bit set of the hashed trigrams of the case folded file.
+    A file whose filter misses a trigram every match contains can not
+    match and is not read again. Hash collisions only let extra files
+    through. An entry is only used while the file keeps the modification
+    time and size it had when it was read, everything else is searched and
+    indexed again.
+    """
+
+    def __init__(self, directory, root):
+        self.directory = directory
+        self.root = root
+        # {filepath: (mtime, size, filter bits, filter)}
+        self.files = {}
+        self.changed = False
+
+    @property
+    def path(self):
+        digest = hashlib.blake2b(self.root.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+        return os.path.join(self.directory, digest + ".json")
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as index_file:
+                data = json.load(index_file)
+            if data.get("version") != TRIGRAM_INDEX_VERSION or data.get("root") != self.root:
+                return
+            self.files = {filepath: (mtime, size, bits, int(bit_set, 16))
+                          for filepath, (mtime, size, bits, bit_set) in data["files"].items()}
+        except (OSError, KeyError, TypeError, ValueError):
+            self.files = {}
+
+    def save(self):
+        data = {
+            "version": TRIGRAM_INDEX_VERSION,
+            "root": self.root,
+            "files": {filepath: (mtime, size, bits, format(bit_set, "x"))
+                      for filepath, (mtime, size, bits, bit_set) in self.files.items()},
+        }
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.path + ".tmp", 'w', encoding='utf-8') as index_file:
+                json.dump(data, index_file, separators=(",", ":"))
+            os.replace(self.path + ".tmp", self.path)
+        except OSError:
+            return
+        self.changed = False
+
+    def is_indexed(self, filepath, stat):
+        entry = self.files.get(filepath)
+        return entry is not None and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size
+
+    def is_candidate(self, filepath, hashes):
+        """Whether an indexed file has to be searched for a query with the trigram ``hashes``."""
+        if not hashes:
+            return True
+
+        _, _, bits, bit_set = self.files[filepath]
+        mask = 0
+        for trigram_hash in hashes:
+            mask |= 1 << (trigram_hash & (bits - 1))
+        return bit_set & mask == mask
+
+    def update(self, filepath, mtime, size, bits, bit_set):
+        if self.files.get(filepath) != (mtime, size, bits, bit_set):
+            self.files[filepath] = (mtime, size, bits, bit_set)
+            self.changed = True
+
+    def retain(self, filepaths):
+        """Drop the files that are no longer below the root."""
+        removed = self.files.keys() - filepaths
+        for filepath in removed:
+            del self.files[filepath]
+        if removed:
+            self.changed = True
+
+
+def trigram_filter(source):
+    """(bits, bit set) of the trigrams of ``source``, see ``TrigramIndex``."""
+    folded = source.casefold()
+    trigrams = {folded[i:i + 3] for i in range(len(folded) - 2)}
+
+    bits = MIN_FILTER_BITS
+    while bits < len(trigrams) * FILTER_BITS_PER_TRIGRAM:
+        bits <<= 1
+
+    bit_set = bytearray(bits // 8)
+    for trigram in trigrams:
+        trigram_hash = crc32(trigram.encode("utf-8", "surrogatepass")) & (bits - 1)
+        bit_set[trigram_hash >> 3] |= 1 << (trigram_hash & 7)
+
+    return bits, int.from_bytes(bit_set, "little")
+
+
+def query_trigrams(query, use_regex=False):
+    """Hashes of the trigrams every match of the query contains, empty when nothing is known."""
+    if use_regex:
+        try:
+            literals = []
+            _required_literals(sre_parse.parse(query), literals)
+        except (re.error, RecursionError, OverflowError):
+            return set()
+    else:
+        literals = [query]
+
+    hashes = set()
+    for literal in literals:
+        folded = literal.casefold()
+        for i in range(len(folded) - 2):
+            hashes.add(crc32(folded[i:i + 3].encode("utf-8", "surrogatepass")))
+    return hashes
+
+
+def _required_literals(pattern, literals):
+    # Runs of plain characters in a parsed pattern, looking into groups and
+    # into repeats that happen at least once, but not into alternatives
+    run = []
+
+    for op, value in pattern:
+        if op == sre_parse.LITERAL:
+            run.append(chr(value))
+            continue
+
+        literals.append("".join(run))
+        run = []
+
+        if op == sre_parse.SUBPATTERN:
+            _required_literals(value[-1], literals)
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and value[0] >= 1:
+            _required_literals(value[2], literals)
+
+    literals.append("".join(run))
+
+
+def find_positions(source, query, match_case, whole_word=False):
+    """Start and end positions of a literal query, and the offsets of the starts.
+
+    Without ``match_case`` the text and the query are compared case folded,
+    which also matches "STRASSE" with "straße".
+    """
+    # Matches never span lines in the text editor
+    if not query or "\n" in query:
+        return [], [], []
+
+    haystack = source
+    if not match_case:
+        query = query.casefold()
+        haystack = source.casefold()
+        # Folding a few characters makes them longer, the offsets would no
+        # longer line up with the text, so map them one line at a time
+        if len(haystack) != len(source):
+            return _find_folded_positions(source, query, whole_word) + (None,)
+
+    positions = []
+    ends = []
+    offsets = []
+    line = 0
+    line_start = 0
+    previous = 0
+    length = len(query)
+
+    offset = haystack.find(query)
+    while offset >= 0:
+        if whole_word and not is_word_bounded(source, offset, offset + length):
+            offset = haystack.find(query, offset + 1)
+            continue
+
+        newlines = source.count("\n", previous, offset)
+        if newlines:
+            line += newlines
+            line_start = source.rfind("\n", previous, offset) + 1
+        positions.append((line, offset - line_start))
+        ends.append((line, offset - line_start + length))
+        offsets.append(offset)
+
+        previous = offset
+        offset = haystack.find(query, offset + length)
+
+    return positions, ends, offsets
+
+
+def _find_folded_positions(source, query, whole_word):
+    positions = []
+    ends = []
+
+    for line_index, line in enumerate(source.split("\n")):
+        folded = line.casefold()
+
+        # Column in the line of every character of the folded line, and
+        # whether a character's folding starts there
+        columns = None
+        if len(folded) != len(line):
+            columns = []
+            starts = []
+            for column, char in enumerate(line):
+                size = len(char.casefold())
+                columns += [column] * size
+                starts += [True] + [False] * (size - 1)
+            starts.append(True)
+
+        last_end = 0
+        offset = folded.find(query)
+        while offset >= 0:
+            end = offset + len(query)
+            if columns is None:
+                column, column_end = offset, end
+            elif not (starts[offset] and starts[end]):
+                # Part of a character that folds to several, "s" in "ß"
+                offset = folded.find(query, offset + 1)
+                continue
+            else:
+                column, column_end = columns[offset], columns[end - 1] + 1
+
+            # A match inside the expansion of the previous one, or not a word
+            if column < last_end or (whole_word and not is_word_bounded(line, column, column_end)):
+                offset = folded.find(query, offset + 1)
+                continue
+
+            positions.append((line_index, column))
+            ends.append((line_index, column_end))
+            last_end = column_end
+            offset = folded.find(query, end)
+
+    return positions, ends
+
+
+def has_border(query):
+    """Whether a proper prefix of ``query`` is also its suffix, so matches could overlap."""
+    return any(query.endswith(query[:size]) for size in range(1, len(query)))
+
+
+def is_word_bounded(text, start, end):
+    """Whether ``text[start:end]`` has no word character right before or after it."""
+    return ((start == 0 or not _is_word_char(text[start - 1]))
+            and (end == len(text) or not _is_word_char(text[end])))
+
+
+def _is_word_char(char):
+    return char.isalnum() or char == "_"
@@ -0,0 +1,1047 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+"""Symbol index for the Code Map.
+
+Builds a flat, line ordered list of the symbols of a script (classes,
+methods, properties, functions and module constants) together with their
+line ranges. Nothing in here touches bpy, so the index can be built and
+inspected outside of Blender.
+"""
+
+import ast
+import hashlib
+import json
+import keyword
+import os
+import threading
+import tokenize
+
+from bisect import bisect_right
+from collections import OrderedDict
+
+
+CLASS = 'CLASS'
+METHOD = 'METHOD'
+PROPERTY = 'PROPERTY'
+FUNCTION = 'FUNCTION'
+VARIABLE = 'VARIABLE'
+
+SCOPE_KINDS = {CLASS, METHOD, FUNCTION}
+
+IGNORED_TOKENS = {tokenize.COMMENT, tokenize.NL, tokenize.ENDMARKER}
+
+# Lines continuing a compound statement rather than starting a new one
+CLAUSE_KEYWORDS = {"elif", "else", "except", "finally"}
+CLAUSE_PREFIXES = tuple(CLAUSE_KEYWORDS)
+
+PROPERTY_TYPES = (
+    "BoolProperty", "BoolVectorProperty", "CollectionProperty",
+    "EnumProperty", "FloatProperty", "FloatVectorProperty",
+    "IntProperty", "IntVectorProperty", "PointerProperty",
+    "RemoveProperty", "StringProperty"
+)
+
+# Blender base classes the Code Map can filter by, and their filter type
+CLASS_TYPES = {
+    "Panel": "PANEL",
+    "Operator": "OPERATOR",
+    "PropertyGroup": "PROPERTY_GROUP",
+    "UIList": "UI_LIST",
+    "AddonPreferences": "ADDON_PREFERENCES",
+}
+
+PARSE_ERRORS = (SyntaxError, ValueError, OverflowError, MemoryError, RecursionError)
+
+# Rough memory held by a parsed tree per character of source, used to keep
+# the AST cache inside its byte budget without measuring the trees.
+AST_BYTES_PER_CHAR = 40
+
+# ast.parse holds the GIL until it returns, scripts are parsed in runs of
+# top-level statements of about this many lines so the UI keeps drawing
+# while a big one is parsed in the background. A run that does not parse is
+# retried longer, up to the limit, in case it was cut inside a string.
+PARSE_RUN_LINES = 250
+PARSE_RUN_LIMIT = 1000
+
+
+class Symbol:
+    """A single entry of the outline. Line numbers are 1-based and inclusive.
+
+    Symbols are stored in line order, which is a preorder walk of the scope
+    tree: the ``size`` symbols after a class or function are the ones nested
+    in it, so a collapsed subtree is skipped in one step.
+    """
+
+    __slots__ = ("kind", "name", "key", "lineno", "end_lineno", "parent", "base", "body", "has_children",
+                 "depth", "qualname", "size")
+
+    def __init__(self, kind, name, lineno, end_lineno, body, parent=None, base=None):
+        self.kind = kind
+        self.name = name
+        self.key = name.lower()  # Search key, lowered once instead of per draw
+        self.lineno = lineno
+        self.end_lineno = end_lineno
+        self.body = body
+        self.parent = parent
+        self.base = base
+        self.has_children = False
+        self.depth = 0
+        self.qualname = name  # Dotted path through the enclosing scopes
+        self.size = 0  # Number of nested symbols
+
+    def __repr__(self):
+        return "<Symbol {} {!r} {}-{}>".format(self.kind, self.qualname, self.lineno, self.end_lineno)
+
+    def moved(self, offset):
+        """Return a copy of the symbol shifted by ``offset`` lines."""
+        symbol = Symbol(self.kind, self.name, self.lineno + offset, self.end_lineno + offset,
+                        self.body, self.parent, self.base)
+        symbol.has_children = self.has_children
+        symbol.depth = self.depth
+        symbol.qualname = self.qualname
+        symbol.size = self.size
+        return symbol
+
+
+def nested_symbol(kind, name, lineno, end_lineno, body, parent, base=None):
+    """Create a symbol inside the ``parent`` symbol, or at the top level when it is None."""
+    if parent is None:
+        return Symbol(kind, name, lineno, end_lineno, body, base=base)
+
+    symbol = Symbol(kind, name, lineno, end_lineno, body, parent.name, base)
+    symbol.depth = parent.depth + 1
+    symbol.qualname = parent.qualname + "." + name
+    parent.has_children = True
+    return symbol
+
+
+def count_nested(symbols):
+    """Set the ``size`` of every symbol of a line ordered list from the depths."""
+    stack = []
+    for i, symbol in enumerate(symbols):
+        while stack and stack[-1][1].depth >= symbol.depth:
+            start, scope = stack.pop()
+            scope.size = i - start - 1
+        stack.append((i, symbol))
+
+    for start, scope in stack:
+        scope.size = len(symbols) - start - 1
+    return symbols
+
+
+class SymbolIndex:
+    """Symbols of one revision of a text block.
+
+    ``block_starts`` holds the 0-based first line of every top-level
+    statement. It is what allows ``update_index`` to re-parse a single
+    top-level block. ``dirty`` is the (start, end) line range last outlined
+    by the token scanner, which is re-parsed with the next edit, or None.
+    """
+
+    __slots__ = ("source", "symbols", "has_class", "has_nested", "line_hashes", "block_starts", "dirty",
+                 "_scopes", "_search_query", "_search_results", "_search_scored", "_class_types")
+
+    def __init__(self, source, symbols, line_hashes, block_starts, dirty=None):
+        self.source = source
+        self.symbols = symbols
+        self.has_class = any(symbol.kind == CLASS for symbol in symbols)
+        self.has_nested = any(symbol.depth for symbol in symbols)
+        self.line_hashes = line_hashes
+        self.block_starts = block_starts
+        self.dirty = dirty
+        self._scopes = None
+        self._search_query = None
+        self._search_results = None
+        self._search_scored = None
+        self._class_types = None
+
+    @property
+    def scopes(self):
+        """Scope lookup over the classes and functions, built on first use."""
+        if self._scopes is None:
+            self._scopes = ScopeIndex(self.symbols)
+        return self._scopes
+
+    @property
+    def class_types(self):
+        """Class symbols by Blender type (``CLASS_TYPES`` values), resolved on first use."""
+        if self._class_types is None:
+            self._class_types = resolve_class_types(self.source, self.symbols)
+        return self._class_types
+
+    def search(self, query):
+        """Symbols fuzzy matching ``query``, best first.
+
+        The ranking is kept until the query changes; a changed text gets a
+        new index and so a new ranking.
+        """
+        self.scored_search(query)
+        return self._search_results
+
+    def scored_search(self, query):
+        """Sorted (-score, lineno, symbol) entries of ``search``, for merging several indexes."""
+        query = query.lower()
+
+        if query != self._search_query:
+            scored = []
+            for symbol in self.symbols:
+                score = fuzzy_score(query, symbol)
+                if score is not None:
+                    scored.append((-score, symbol.lineno, symbol))
+
+            scored.sort(key=lambda item: item[:2])
+            self._search_scored = scored
+            self._search_results = [symbol for _, _, symbol in scored]
+            self._search_query = query
+
+        return self._search_scored
+
+
+def fuzzy_score(query, symbol):
+    """Score a lower case ``query`` against a symbol name, None when it does not match.
+
+    Every query character has to appear in the name in order. Matches that
+    are contiguous, at the start of the name or at the start of a word
+    (after ``_`` or ``.``, or a camelCase hump) score higher, and gaps
+    between matched characters cost points.
+    """
+    key = symbol.key
+    name = symbol.name
+
+    if not query:
+        return 0
+
+    position = key.find(query)
+    if position >= 0:
+        # Whole query as one run, preferring the name start and short names
+        score = 100 + len(query) * 10 - position - len(key)
+        if position == 0 or _is_word_start(name, position):
+            score += 50
+        return score
+
+    score = 0
+    previous = -1
+    for char in query:
+        i = key.find(char, previous + 1)
+        if i < 0:
+            return None
+
+        if i == previous + 1:
+            score += 5
+        if _is_word_start(name, i):
+            score += 10
+        score -= i - previous - 1
+        previous = i
+
+    return score - len(key)
+
+
+def _is_word_start(name, i):
+    if i == 0:
+        return True
+    before = name[i - 1]
+    return before in "_." or (name[i].isupper() and before.islower())
+
+
+class ScopeIndex:
+    """Enclosing scopes of any line in O(log n).
+
+    Class and function spans are properly nested, so the text splits into
+    runs of lines that share the same chain of enclosing scopes. ``starts``
+    holds the first line of every run and ``chains`` the scopes of that run,
+    outermost first, so a lookup is a single bisect.
+    """
+
+    __slots__ = ("starts", "chains")
+
+    def __init__(self, symbols):
+        self.starts = []
+        self.chains = []
+
+        scopes = [symbol for symbol in symbols if symbol.kind in SCOPE_KINDS]
+        scopes.sort(key=lambda symbol: (symbol.lineno, -symbol.end_lineno))
+
+        stack = []
+        for scope in scopes:
+            while stack and stack[-1].end_lineno < scope.lineno:
+                self._mark(stack.pop().end_lineno + 1, stack)
+            stack.append(scope)
+            self._mark(scope.lineno, stack)
+
+        while stack:
+            self._mark(stack.pop().end_lineno + 1, stack)
+
+    def _mark(self, lineno, stack):
+        chain = tuple(stack)
+
+        # Scopes ending on the same line only keep the outermost chain
+        if self.starts and self.starts[-1] == lineno:
+            self.chains[-1] = chain
+        else:
+            self.starts.append(lineno)
+            self.chains.append(chain)
+
+    def scopes_at(self, lineno):
+        """Return the scopes enclosing the 1-based ``lineno``, outermost first."""
+        i = bisect_right(self.starts, lineno) - 1
+        return self.chains[i] if i >= 0 else ()
+
+    def scope_at(self, lineno):
+        """Return the innermost scope enclosing ``lineno``, or None."""
+        chain = self.scopes_at(lineno)
+        return chain[-1] if chain else None
+
+
+# -------------------------------------------------------------
+#                          AST Cache
+# -------------------------------------------------------------
+
+
+def source_digest(source):
+    return hashlib.blake2b(source.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+
+class ASTCache:
+    """Least recently used cache of parsed trees.
+
+    Entries are keyed by (text name, content digest), so an unchanged script
+    is parsed once no matter how often it is drawn, and going back to an
+    earlier revision (undo) or switching between texts hits the cache too.
+    Sources that do not parse are cached as None so they are not retried.
+    The cache is shared with the background parser, hence the lock.
+    """
+
+    def __init__(self, max_entries=16, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (tree, size)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def configure(self, max_entries, max_bytes):
+        with self.lock:
+            self.max_entries = max_entries
+            self.max_bytes = max_bytes
+            self.evict()
+
+    def parse(self, name, source):
+        key = (name, source_digest(source))
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        try:
+            tree = parse_runs(source)
+        except PARSE_ERRORS:
+            tree = None
+
+        size = len(source) * AST_BYTES_PER_CHAR if tree is not None else len(source)
+        with self.lock:
+            if key not in self.entries:
+                self.entries[key] = (tree, size)
+                self.size += size
+                self.evict()
+
+        return tree
+
+    def evict(self):
+        # Always keep the newest entry, even when it is over budget by itself
+        while len(self.entries) > 1 and (len(self.entries) > self.max_entries or self.size > self.max_bytes):
+            _, (_, size) = self.entries.popitem(last=False)
+            self.size -= size
+
+    def discard(self, name):
+        """Drop the trees of a text that no longer exists."""
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == name]:
+                self.size -= self.entries.pop(key)[1]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+            self.hits = 0
+            self.misses = 0
+
+
+ast_cache = ASTCache()
+
+
+# -------------------------------------------------------------
+#                          Disk Cache
+# -------------------------------------------------------------
+
+
+# Bump whenever the stored layout or the meaning of a symbol changes
+DISK_CACHE_VERSION = 3
+
+
+class DiskCache:
+    """Symbol indexes of files on disk, one JSON file per path.
+
+    An entry is only valid for the modification time and size the file had
+    when it was indexed, and for the exact source it was built from, so a
+    file changed outside of Blender is re-parsed. Loading an entry touches
+    it, and the least recently used ones are removed once the directory is
+    over ``max_bytes``.
+    """
+
+    def __init__(self, directory, max_bytes=32 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def entry_path(self, filepath):
+        digest = hashlib.blake2b(filepath.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+        return os.path.join(self.directory, digest + ".json")
+
+    def load(self, filepath, source, stat):
+        """Return the cached index of ``filepath`` or None if there is no valid one."""
+        entry_path = self.entry_path(filepath)
+        try:
+            with open(entry_path, 'r', encoding='utf-8') as entry_file:
+                data = json.load(entry_file)
+        except (OSError, ValueError):
+            return None
+
+        if (data.get("version") != DISK_CACHE_VERSION or data.get("path") != filepath
+                or data.get("mtime") != stat.st_mtime_ns or data.get("size") != stat.st_size
+                or data.get("digest") != source_digest(source).hex()):
+            self.remove(entry_path)
+            return None
+
+        try:
+            index = index_from_data(source, data)
+        except (KeyError, IndexError, TypeError, ValueError):
+            self.remove(entry_path)
+            return None
+
+        try:
+            os.utime(entry_path)
+        except OSError:
+            pass
+        return index
+
+    def save(self, filepath, index, stat):
+        data = index_to_data(index)
+        data.update({
+            "version": DISK_CACHE_VERSION,
+            "path": filepath,
+            "mtime": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "digest": source_digest(index.source).hex(),
+        })
+
+        entry_path = self.entry_path(filepath)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # Write next to the entry first so a crash never leaves half a file
+            with open(entry_path + ".tmp", 'w', encoding='utf-8') as entry_file:
+                json.dump(data, entry_file, separators=(",", ":"))
+            os.replace(entry_path + ".tmp", entry_path)
+        except OSError:
+            return
+
+        self.prune()
+
+    def prune(self):
+        try:
+            entries = [entry for entry in os.scandir(self.directory)
+                       if entry.is_file() and entry.name.endswith(".json")]
+        except OSError:
+            return
+
+        entries = [(entry.stat().st_mtime, entry.stat().st_size, entry.path) for entry in entries]
+        size = sum(entry[1] for entry in entries)
+
+        for _, entry_size, entry_path in sorted(entries):
+            if size <= self.max_bytes:
+                break
+            self.remove(entry_path)
+            size -= entry_size
+
+    def clear(self):
+        try:
+            entries = list(os.scandir(self.directory))
+        except OSError:
+            return
+
+        for entry in entries:
+            if entry.name.endswith(".json"):
+                self.remove(entry.path)
+
+    @staticmethod
+    def remove(entry_path):
+        try:
+            os.remove(entry_path)
+        except OSError:
+            pass
+
+
+def index_to_data(index):
+    return {
+        "symbols": [
+            [symbol.kind, symbol.name, symbol.lineno, symbol.end_lineno, symbol.parent,
+             symbol.base, symbol.has_children, symbol.depth, symbol.qualname, symbol.size]
+            for symbol in index.symbols
+        ],
+        "block_starts": index.block_starts,
+    }
+
+
+def index_from_data(source, data):
+    """Rebuild an index stored by ``index_to_data`` without parsing ``source``."""
+    lines = source.split("\n")
+
+    symbols = []
+    for kind, name, lineno, end_lineno, parent, base, has_children, depth, qualname, size in data["symbols"]:
+        symbol = Symbol(kind, name, lineno, end_lineno, lines[lineno - 1], parent, base)
+        symbol.has_children = has_children
+        symbol.depth = depth
+        symbol.qualname = qualname
+        symbol.size = size
+        symbols.append(symbol)
+
+    return SymbolIndex(source, symbols, list(map(hash, lines)), list(data["block_starts"]), data.get("dirty"))
+
+
+# -------------------------------------------------------------
+#                          Builders
+# -------------------------------------------------------------
+
+
+def build_index(source, name=""):
+    lines = source.split("\n")
+    line_hashes = list(map(hash, lines))
+
+    tree = ast_cache.parse(name, source)
+    if tree is None:
+        symbols, block_starts = scan_tokens(lines)
+        return SymbolIndex(source, symbols, line_hashes, block_starts)
+
+    symbols = symbols_from_tree(tree, lines)
+    block_starts = [_block_start(node) for node in tree.body]
+
+    return SymbolIndex(source, symbols, line_hashes, block_starts)
+
+
+def update_index(index, source, name=""):
+    """Return the index of ``source``, re-parsing only what changed since ``index``.
+
+    The changed line range is found by comparing per-line hashes against the
+    previous revision. It is widened to whole top-level blocks, that region
+    alone is parsed and its symbols are spliced between the untouched ones.
+    A region that does not parse is outlined by the token scanner instead
+    and stays dirty until an edit re-parses it, and a full build is only done
+    when most of the file changed.
+    """
+    if index is None:
+        return build_index(source, name)
+
+    lines = source.split("\n")
+    line_hashes = list(map(hash, lines))
+    old_hashes = index.line_hashes
+
+    old_count = len(old_hashes)
+    new_count = len(line_hashes)
+    limit = min(old_count, new_count)
+
+    # Unchanged lines at the start and at the end of the text
+    start = 0
+    while start < limit and old_hashes[start] == line_hashes[start]:
+        start += 1
+
+    if start == old_count == new_count:
+        return SymbolIndex(source, index.symbols, line_hashes, index.block_starts, index.dirty)
+
+    end = 0
+    while end < limit - start and old_hashes[old_count - end - 1] == line_hashes[new_count - end - 1]:
+        end += 1
+
+    old_end = old_count - end
+    offset = new_count - old_count
+
+    # A region the token scanner outlined last time is parsed again with it
+    changed_start, changed_end = start, old_end
+    if index.dirty is not None:
+        start = min(start, index.dirty[0])
+        old_end = max(old_end, index.dirty[1])
+
+    # Widen the change to the top-level blocks around it. The block before an
+    # insertion point is included too, since inserted lines may extend it.
+    block_starts = index.block_starts
+    first = bisect_right(block_starts, max(start - 1, 0)) - 1
+    last = bisect_right(block_starts, max(old_end - 1, start))
+
+    region_start = block_starts[first] if first >= 0 else 0
+    region_end = block_starts[last] if last < len(block_starts) else old_count
+
+    # Not worth splicing when most of the file is affected
+    if region_end - region_start > old_count // 2:
+        return build_index(source, name)
+
+    dirty = None
+    try:
+        tree = parse_runs("\n".join(lines[region_start:region_end + offset]))
+    except PARSE_ERRORS:
+        # Keep the rest of the outline while the edited block is broken. The
+        # scanner can take a line inside a bracket for a new block, so the
+        # block starts of the unchanged lines are kept instead of its own.
+        region_symbols, _ = scan_tokens(lines, region_start, region_end + offset)
+        region_starts = ([line for line in block_starts[max(first, 0):last] if line < changed_start]
+                         + [line + offset for line in block_starts[max(first, 0):last] if line >= changed_end])
+        dirty = (region_start, region_end + offset)
+    else:
+        ast.increment_lineno(tree, region_start)
+        region_symbols = symbols_from_tree(tree, lines)
+        region_starts = [_block_start(node) for node in tree.body]
+
+    before = [symbol for symbol in index.symbols if symbol.lineno <= region_start]
+    after = [symbol.moved(offset) for symbol in index.symbols if symbol.lineno > region_end]
+    symbols = before + region_symbols + after
+
+    block_starts = (block_starts[:max(first, 0)]
+                    + region_starts
+                    + [line + offset for line in block_starts[last:]])
+
+    return SymbolIndex(source, symbols, line_hashes, block_starts, dirty)
+
+
+def parse_runs(source):
+    """Parse ``source`` like ``ast.parse``, one run of top-level statements at a time.
+
+    Runs end before a line that can start a top-level statement, their
+    trees are joined into one module. A single statement is still parsed in
+    one go. A run that does not parse within ``PARSE_RUN_LIMIT`` lines
+    raises, as the whole source would.
+    """
+    lines = source.split("\n")
+    body = []
+    start = 0
+    size = PARSE_RUN_LINES
+
+    while start < len(lines):
+        end = _statement_start(lines, start + size)
+        try:
+            # Leading blank lines put the nodes on their line in the source
+            tree = ast.parse("\n" * start + "\n".join(lines[start:end]))
+        except PARSE_ERRORS:
+            if end == len(lines) or end - start >= PARSE_RUN_LIMIT:
+                raise
+            # The cut may be inside a string or a bracket
+            size = (end - start) * 2
+            continue
+
+        body += tree.body
+        start = end
+        size = PARSE_RUN_LINES
+
+    return ast.Module(body=body, type_ignores=[])
+
+
+def _statement_start(lines, start):
+    """First line from ``start`` on that can begin a top-level statement."""
+    for i in range(start, len(lines)):
+        line = lines[i]
+        if (line and not line[0].isspace() and line[0] not in "#)]}"
+                and not line.startswith(CLAUSE_PREFIXES) and not lines[i - 1].startswith("@")):
+            return i
+    return len(lines)
+
+
+# Last index of every text given to ``update_index_data`` in this process
+process_indexes = {}
+
+
+def update_index_data(name, source):
+    """``update_index`` for a worker process, returned as ``index_to_data`` output.
+
+    The process keeps the last index of the texts parsed most recently, so
+    edits are still parsed incrementally there and no syntax tree reaches
+    the caller.
+    """
+    index = update_index(process_indexes.pop(name, None), source, name)
+    process_indexes[name] = index
+
+    # Removed texts are dropped in time, the least recently parsed first
+    while len(process_indexes) > ast_cache.max_entries:
+        del process_indexes[next(iter(process_indexes))]
+
+    data = index_to_data(index)
+    data["dirty"] = index.dirty
+    return data
+
+
+def _block_start(node):
+    decorators = getattr(node, "decorator_list", None)
+    lineno = min(decorator.lineno for decorator in decorators) if decorators else node.lineno
+    return lineno - 1
+
+
+def parse_class_line(line):
+    class_name = line.split("(")[0].replace("class ", "").strip().replace(":", "").strip()
+
+    # Check if there is a base class specified
+    if "(" in line and ")" in line:
+        base_class = line.split("(")[1].split(")")[0].strip()
+    else:
+        base_class = None
+
+    return class_name, base_class
+
+
+def class_bases(base_class):
+    """Dotted names of the bases in a class header, keyword arguments left out."""
+    if not base_class:
+        return []
+    return [base.strip() for base in base_class.split(",") if base.strip() and "=" not in base]
+
+
+def is_property_line(line):
+    return any(keyword in line for keyword in PROPERTY_TYPES)
+
+
+def _target_name(node):
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        value = _target_name(node.value)
+        return "{}.{}".format(value, node.attr) if value else node.attr
+    if isinstance(node, (ast.Tuple, ast.List)):
+        return ", ".join(filter(None, (_target_name(elt) for elt in node.elts)))
+    return None
+
+
+def symbols_from_tree(tree, lines):
+    symbols = []
+    _symbols_from_nodes(tree.body, lines, None, symbols)
+    return count_nested(symbols)
+
+
+def _symbols_from_nodes(nodes, lines, parent, symbols):
+    """Add the symbols of a statement list, recursing into classes and functions.
+
+    Only statements directly in a class or function body are looked at, the
+    bodies of if, for, try and the like are not outlined.
+    """
+    in_class = parent is not None and parent.kind == CLASS
+
+    for node in nodes:
+        body = lines[node.lineno - 1]
+
+        if isinstance(node, ast.ClassDef):
+            _, base_class = parse_class_line(body)
+            symbol = nested_symbol(CLASS, node.name, node.lineno, node.end_lineno, body, parent, base_class)
+            symbols.append(symbol)
+            _symbols_from_nodes(node.body, lines, symbol, symbols)
+
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            kind = METHOD if in_class else FUNCTION
+            symbol = nested_symbol(kind, node.name, node.lineno, node.end_lineno, body, parent)
+            symbols.append(symbol)
+            _symbols_from_nodes(node.body, lines, symbol, symbols)
+
+        elif (in_class and isinstance(node, ast.AnnAssign) and isinstance(node.target, ast.Name)
+                and is_property_line(body)):
+            symbols.append(nested_symbol(PROPERTY, node.target.id, node.lineno, node.end_lineno,
+                                         body, parent))
+
+        elif (parent is None and isinstance(node, (ast.Assign, ast.AnnAssign))
+                and not body.startswith((" ", "#"))):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            name = _target_name(targets[0]) or body.split()[0]
+            symbols.append(Symbol(VARIABLE, name, node.lineno, node.end_lineno, body))
+
+
+# -------------------------------------------------------------
+#                         Class Types
+# -------------------------------------------------------------
+
+
+def import_statements(lines):
+    """Yield the parsed import statements of a script, at any indentation.
+
+    Only the import lines are parsed, so this stays cheap on scripts that do
+    not parse as a whole.
+    """
+    row = 0
+    while row < len(lines):
+        line = lines[row].strip()
+        row += 1
+        if not line.startswith(("import ", "from ")):
+            continue
+
+        # Join parenthesized and backslash continued imports
+        statement = line
+        while ((statement.count("(") > statement.count(")") or statement.endswith("\\"))
+               and row < len(lines)):
+            statement = statement.rstrip("\\") + " " + lines[row].strip()
+            row += 1
+
+        try:
+            tree = ast.parse(statement)
+        except PARSE_ERRORS:
+            continue
+
+        for node in tree.body:
+            if isinstance(node, (ast.Import, ast.ImportFrom)):
+                yield node
+
+
+def import_names(lines):
+    """Map every name bound by an import to the qualified name it stands for.
+
+    Modules imported with ``*`` are returned separately.
+    """
+    names = {}
+    star_modules = []
+
+    for node in import_statements(lines):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.asname:
+                    names[alias.asname] = alias.name
+                else:
+                    # "import bpy.types" binds "bpy"
+                    head = alias.name.split(".")[0]
+                    names[head] = head
+
+        elif node.module and not node.level:
+            for alias in node.names:
+                if alias.name == "*":
+                    star_modules.append(node.module)
+                else:
+                    names[alias.asname or alias.name] = "{}.{}".format(node.module, alias.name)
+
+    return names, star_modules
+
+
+def resolve_class_types(source, symbols):
+    """Sort the classes of a script by the Blender type they derive from.
+
+    Bases are resolved through the imports of the script, so aliases
+    (``from bpy.types import Operator as Op``), module aliases
+    (``import bpy.types as T``) and classes deriving from another class of
+    the same script are recognised. The first base with a known type wins.
+    """
+    names, star_modules = import_names(source.split("\n"))
+    local_types = {}
+    class_types = {class_type: set() for class_type in CLASS_TYPES.values()}
+
+    def base_type(base):
+        head, _, rest = base.partition(".")
+
+        if not rest and head in local_types:
+            return local_types[head]
+
+        if head in names:
+            qualified = names[head] + ("." + rest if rest else "")
+        elif not rest and "bpy.types" in star_modules:
+            qualified = "bpy.types." + head
+        else:
+            qualified = base
+
+        module, _, name = qualified.rpartition(".")
+        if module in ("bpy.types", ""):
+            return CLASS_TYPES.get(name)
+        return None
+
+    for symbol in symbols:
+        if symbol.kind != CLASS:
+            continue
+
+        for base in class_bases(symbol.base):
+            class_type = base_type(base)
+            if class_type is not None:
+                local_types[symbol.name] = class_type
+                class_types[class_type].add(symbol)
+                break
+
+    return class_types
+
+
+# -------------------------------------------------------------
+#                     Tolerant Token Scanner
+# -------------------------------------------------------------
+
+
+def scan_tokens(lines, start=0, end=None):
+    """Outline of ``lines[start:end]`` for scripts that do not parse.
+
+    Walks the ``tokenize`` stream keeping a stack of open classes and
+    functions, and returns the same (symbols, block_starts) shape as the AST
+    path with absolute line numbers. When the tokenizer gives up on a broken
+    statement, the statements before it are kept and scanning resumes at the
+    next line that starts in column 0, so a single typo does not hide the
+    rest of the outline.
+    """
+    if end is None:
+        end = len(lines)
+
+    scanner = _TokenScanner(lines)
+    row = start
+    while row < end:
+        row = scanner.scan(row, end)
+
+    return count_nested(scanner.symbols), scanner.block_starts
+
+
+class _TokenScanner:
+    def __init__(self, lines):
+        self.lines = lines
+        self.symbols = []
+        self.block_starts = []
+
+    def scan(self, start, end):
+        """Scan ``lines[start:end]`` and return the line to continue from."""
+        readline = iter([line + "\n" for line in self.lines[start:end]]).__next__
+
+        self.scopes = []  # (symbol or None, depth) of the open classes and functions
+        self.last_code_line = start
+        self.decorated = False
+
+        statement = []
+        statement_row = start + 1
+        statement_depth = 0
+        depth = 0
+
+        try:
+            for token in tokenize.generate_tokens(readline):
+                if token.type in IGNORED_TOKENS:
+                    continue
+
+                row = token.start[0] + start
+
+                if token.type == tokenize.INDENT:
+                    depth += 1
+                elif token.type == tokenize.DEDENT:
+                    depth -= 1
+                elif token.type == tokenize.NEWLINE:
+                    if statement:
+                        self.statement(statement, statement_row, row, statement_depth)
+                        self.last_code_line = row
+                    statement = []
+                else:
+                    if not statement:
+                        statement_row = row
+                        statement_depth = depth
+                    statement.append(token)
+
+        except (tokenize.TokenError, SyntaxError):
+            self.close_scopes(0)
+
+            # Resume at the next line that can start a top-level statement,
+            # a closing bracket only ends the broken one
+            for i in range(statement_row, end):
+                line = self.lines[i]
+                if line and not line[0].isspace() and line[0] not in "#)]}":
+                    return i
+            return end
+
+        self.close_scopes(0)
+        return end
+
+    def close_scopes(self, depth):
+        while self.scopes and self.scopes[-1][1] >= depth:
+            symbol, _ = self.scopes.pop()
+            if symbol is not None:
+                symbol.end_lineno = self.last_code_line
+
+    def statement(self, tokens, row, end_row, depth):
+        self.close_scopes(depth)
+
+        first = tokens[0].string
+        if depth == 0 and first not in CLAUSE_KEYWORDS:
+            if not self.decorated:
+                self.block_starts.append(row - 1)
+            self.decorated = first == "@"
+
+        if first == "@":
+            return
+
+        body = self.lines[row - 1]
+
+        # Only statements directly in the body of an outlined scope are
+        # outlined themselves, as in the AST path
+        if self.scopes:
+            parent, parent_depth = self.scopes[-1]
+            outlined = parent is not None and parent_depth == depth - 1
+        else:
+            parent = None
+            outlined = depth == 0
+        in_class = outlined and parent is not None and parent.kind == CLASS
+
+        if first == "async" and len(tokens) > 1 and tokens[1].string == "def":
+            tokens = tokens[1:]
+            first = "def"
+
+        if first in ("def", "class") and len(tokens) > 1:
+            name = tokens[1].string
+            symbol = None
+
+            if outlined and first == "class":
+                _, base_class = parse_class_line(body)
+                symbol = nested_symbol(CLASS, name, row, end_row, body, parent, base_class)
+            elif outlined:
+                kind = METHOD if in_class else FUNCTION
+                symbol = nested_symbol(kind, name, row, end_row, body, parent)
+
+            if symbol is not None:
+                self.symbols.append(symbol)
+            self.scopes.append((symbol, depth))
+
+        elif depth == 0 and not keyword.iskeyword(first):
+            name = self.assignment_target(tokens, body)
+            if name:
+                self.symbols.append(Symbol(VARIABLE, name, row, end_row, body))
+
+        elif (in_class and len(tokens) > 2 and tokens[0].type == tokenize.NAME
+                and tokens[1].string == ":" and is_property_line(body)):
+            self.symbols.append(nested_symbol(PROPERTY, first, row, end_row, body, parent))
+
+    def assignment_target(self, tokens, body):
+        """Source of the target when the statement is an assignment, else None."""
+        nesting = 0
+
+        for i, token in enumerate(tokens):
+            if token.type != tokenize.OP:
+                continue
+
+            if token.string in ("(", "[", "{"):
+                nesting += 1
+            elif token.string in (")", "]", "}"):
+                nesting -= 1
+            elif nesting:
+                continue
+            elif token.string == "=" or (token.string == ":" and i > 0):
+                # Only the part of the target on the first line
+                first_row, first_col = tokens[0].start
+                row, col = token.start
+                target = body[first_col:col] if row == first_row else body[first_col:]
+                return target.strip() or None
+            elif token.string not in (".", ","):
+                return None
+
+        return None
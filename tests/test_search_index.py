@@ -0,0 +1,150 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+
+"""Find & Replace match index, runs without Blender from the addon folder:
+
+    python -m pytest
+"""
+
+import importlib.util
+import os
+
+
+# search_index does not need bpy, load it without the addon's __init__
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+spec = importlib.util.spec_from_file_location("search_index", os.path.join(ADDON_DIR, "search_index.py"))
+search_index = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(search_index)
+
+MatchIndex = search_index.MatchIndex
+
+
+def test_folded_match_does_not_split_an_expanding_character():
+    assert MatchIndex("Maß Masse", "s", False).positions == [(0, 6), (0, 7)]
+    assert search_index.replace_matches(MatchIndex("Maß Masse", "s", False), "z") == ("Maß Mazze", 2)
+
+
+def test_folded_match_covers_whole_expanding_characters():
+    index = MatchIndex("Maß STRASSE\nstraße", "ss", False)
+
+    assert index.positions == [(0, 2), (0, 8), (1, 4)]
+    assert [index.match(i) for i in range(len(index))] == [(0, 2, 1), (0, 8, 2), (1, 4, 1)]
+
+
+def test_whole_word_regex_keeps_global_flags():
+    source = "foo food FOO\nf o o"
+
+    assert MatchIndex(source, "(?i)foo", True, True, True).positions == [(0, 0), (0, 9)]
+    assert MatchIndex(source, "(?x) f o o  # spaced out", True, True, True).positions == [(0, 0)]
+    assert MatchIndex(source, "(?i)(?x) f o o", True, True, True).error is None
+
+
+def test_refine_matches_a_fresh_index():
+    random = __import__("random").Random(0)
+    refined = 0
+
+    for _ in range(5000):
+        alphabet = random.choice(["ab", "abc", "aB \n", "xyzXYZ_ ", "aßb"])
+        source = "".join(random.choice(alphabet) for _ in range(random.randint(0, 60)))
+        query = "".join(random.choice(alphabet) for _ in range(random.randint(1, 3)))
+        longer = query + "".join(random.choice(alphabet) for _ in range(random.randint(1, 3)))
+        match_case = random.random() < 0.5
+
+        index = MatchIndex(source, query, match_case).refine(source, longer, match_case)
+        if index is None:
+            continue
+
+        refined += 1
+        fresh = MatchIndex(source, longer, match_case)
+        assert (index.positions, index.ends, index.offsets) == (fresh.positions, fresh.ends, fresh.offsets)
+        assert index.is_valid(source, longer, match_case)
+
+    # Most cases take the refined path
+    assert refined > 2000
+
+
+def test_refine_falls_back_to_a_search():
+    # "aa" overlaps itself, its matches in "aaab" skip the "aab" at 1
+    assert MatchIndex("aaab", "aa", True).refine("aaab", "aab", True) is None
+    # Folding "ß" does not keep columns one to one
+    assert MatchIndex("straße", "st", False).refine("straße", "str", False) is None
+    assert MatchIndex("foo", "fo", True, True).refine("foo", "foo", True, True) is None
+    assert MatchIndex("foo", "fo", True, False, True).refine("foo", "foo", True, False, True) is None
+    assert MatchIndex("foo", "fo", True).refine("foo bar", "foo", True) is None
+
+
+def required_literals(pattern):
+    literals = []
+    search_index._required_literals(search_index.sre_parse.parse(pattern), literals)
+    return [literal for literal in literals if literal]
+
+
+def test_required_literals_of_a_regex():
+    assert required_literals(r"def\s+foo_bar") == ["def", "foo_bar"]
+    assert required_literals(r"(abc|xyz)def") == ["def"]
+    assert required_literals(r"(?:hello)+ world") == ["hello", " world"]
+    assert required_literals(r"(?:hello)? world") == [" world"]
+
+
+SOURCES = {
+    "operator.py": "class SIMPLE_OT_operator(bpy.types.Operator):\n    def execute(self, context):\n        pass\n",
+    "straße.py": "STRASSE = 'Straße'\nimport os\n",
+    "empty.py": "",
+    "binary.bin": "ab\0cdef",
+}
+
+QUERIES = [
+    ("import os", False, True),
+    ("def execute", False, False),
+    ("STRASSE", False, False),
+    ("straße", False, False),
+    (r"class \w+_OT_\w+", True, True),
+    (r"(?i)def\s+EXECUTE", True, True),
+    (r"import (os|sys)", True, True),
+    ("ab", False, False),
+]
+
+
+def test_trigram_index_keeps_every_matching_file(tmp_path):
+    root = tmp_path / "project"
+    root.mkdir()
+    for name, source in SOURCES.items():
+        (root / name).write_text(source, encoding="utf-8")
+
+    files = [(path, stat.st_mtime_ns, stat.st_size) for path, stat in search_index.walk_files(str(root))]
+    _, filters = search_index.search_files(files, "", True)
+
+    index = search_index.TrigramIndex(str(tmp_path / "index"), str(root))
+    for file_filter in filters:
+        index.update(*file_filter)
+    index.save()
+
+    loaded = search_index.TrigramIndex(str(tmp_path / "index"), str(root))
+    loaded.load()
+    assert loaded.files == index.files
+
+    for query, use_regex, match_case in QUERIES:
+        trigrams = search_index.query_trigrams(query, use_regex)
+        for path, _, _ in files:
+            if search_index.search_file(path, query, match_case, use_regex):
+                assert loaded.is_candidate(path, trigrams), (query, path)
+
+    # A query none of the files contain rules them all out
+    trigrams = search_index.query_trigrams("zq_not_there", False)
+    assert not any(loaded.is_candidate(path, trigrams) for path, _, _ in files)
@@ -0,0 +1,132 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+
+"""Incremental Code Map outline, runs without Blender from the addon folder:
+
+    python -m pytest
+"""
+
+import ast
+import importlib.util
+import os
+
+import pytest
+
+
+# symbol_index does not need bpy, load it without the addon's __init__
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+spec = importlib.util.spec_from_file_location("symbol_index", os.path.join(ADDON_DIR, "symbol_index.py"))
+symbol_index = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(symbol_index)
+
+
+FUNCTIONS = "".join("def f{0}():\n    return {0}\n\n\n".format(n) for n in range(20))
+
+SOURCE = FUNCTIONS + """classes = [
+    A,
+
+    B,
+]
+
+
+def keymaps():
+    pass
+
+
+last = 1
+"""
+
+# Statements that go on over lines starting in column 0
+CONTINUED = SOURCE + '''
+DOC = """
+not a statement
+"""
+
+
+@decorator
+def decorated():
+    pass
+
+
+if last:
+    pass
+else:
+    pass
+total = 1 + \\
+2
+'''
+
+
+def outline(index):
+    return ([(symbol.kind, symbol.qualname, symbol.lineno, symbol.end_lineno) for symbol in index.symbols],
+            index.block_starts)
+
+
+def type_and_undo(source, line, typed):
+    """Type ``typed`` on an empty ``line`` one character at a time, then delete it again."""
+    lines = source.split("\n")
+    index = symbol_index.build_index(source)
+
+    for end in list(range(1, len(typed) + 1)) + list(range(len(typed) - 1, -1, -1)):
+        lines[line] = typed[:end]
+        index = symbol_index.update_index(index, "\n".join(lines))
+
+    return index
+
+
+def test_undone_edit_in_brackets_matches_full_build():
+    blank = SOURCE.split("\n").index("    A,") + 1
+    index = type_and_undo(SOURCE, blank, "    def m(self):")
+
+    assert index.source == SOURCE
+    assert outline(index) == outline(symbol_index.build_index(SOURCE))
+
+
+def test_undone_edits_match_full_build():
+    lines = SOURCE.split("\n")
+    full = outline(symbol_index.build_index(SOURCE))
+
+    for typed in ("def m(self):", "x = (1,", "class K(", "    if a:", "[", "@decorator", "    y = {'a': 1}"):
+        for line in range(len(lines) + 1):
+            source = "\n".join(lines[:line] + [""] + lines[line:])
+            index = type_and_undo(source, line, typed)
+            index = symbol_index.update_index(index, SOURCE)
+
+            assert outline(index) == full, (typed, line)
+
+
+def test_parse_runs_matches_ast_parse(monkeypatch):
+    # Runs of two lines get cut inside strings, decorators and clauses
+    monkeypatch.setattr(symbol_index, "PARSE_RUN_LINES", 2)
+
+    assert (ast.dump(symbol_index.parse_runs(CONTINUED), include_attributes=True)
+            == ast.dump(ast.parse(CONTINUED), include_attributes=True))
+
+    with pytest.raises(SyntaxError):
+        symbol_index.parse_runs(CONTINUED.replace("def keymaps():", "def keymaps(:"))
+
+
+def test_index_data_matches_update_index():
+    broken = SOURCE.replace("def keymaps():", "def keymaps(:")
+    symbol_index.update_index_data("data", SOURCE)
+    index = symbol_index.index_from_data(broken, symbol_index.update_index_data("data", broken))
+    expected = symbol_index.update_index(symbol_index.build_index(SOURCE), broken)
+
+    assert index.dirty is not None
+    assert (outline(index), index.dirty) == (outline(expected), expected.dirty)